@@ -0,0 +1,86 @@
+"""
+查詢流程壓力測試：啟動本地模擬伺服器（mock_providers.py），以合成參考文獻跑完整查詢流程
+
+    python benchmarks/bench_lookups.py --style mixed --size 500 --latency lognormal:150:0.6 --rate-429 scopus=0.1
+    python benchmarks/bench_lookups.py --size 2000 --rate-scale 10 --quota serpapi=300
+
+- 冷啟動（空的查詢快取）與重跑（快取命中）各跑一次，回報耗時、每秒參考文獻數、各分類筆數與伺服器收到的請求數
+- 查詢快取寫入暫存目錄，不影響正式快取
+- --rate-scale 放大 scheduler.PROVIDER_LIMITS 的速率上限（模擬伺服器沒有真正的限速）
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+# 必須在匯入 refcheck 之前設定
+CACHE_DIR = tempfile.mkdtemp(prefix="refcheck-bench-")
+os.environ["REFCHECK_CACHE_DIR"] = CACHE_DIR
+os.environ["REFCHECK_DOCUMENT_CACHE"] = "0"
+
+import corpus  # noqa: E402
+import mock_providers  # noqa: E402
+from refcheck import providers, scheduler  # noqa: E402
+from refcheck.pipeline import check_file, new_file_results  # noqa: E402
+from refcheck.rules import scan_reference  # noqa: E402
+
+
+def run_once(title_pairs, server):
+    server.state.reset()
+    file_results = new_file_results("bench", list(title_pairs))
+    start = time.perf_counter()
+    file_results, _, _ = check_file(file_results)
+    elapsed = time.perf_counter() - start
+    counts = {status.value: n for status, n in file_results.counts.items() if n}
+    return elapsed, counts, server.state.stats
+
+
+def report(label, size, elapsed, counts, stats):
+    print(f"\n{label}：{elapsed:.2f} 秒，{size / elapsed:,.1f} 筆/秒")
+    print("  分類：" + "、".join(f"{bucket} {n}" for bucket, n in counts.items()))
+    for provider, s in stats.items():
+        if s["requests"]:
+            print(
+                f"  {provider:<9} 請求 {s['requests']:>5}  成功 {s['ok']:>5}  429 {s['throttled']:>4}"
+                f"  5xx {s['errors']:>4}  額度用完 {s['quota_exceeded']:>4}"
+                f"  平均延遲 {1000 * s['latency_s'] / s['requests']:>7.1f} ms"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="以本地模擬伺服器測試查詢流程的吞吐量")
+    parser.add_argument("--style", default="mixed", choices=corpus.STYLES)
+    parser.add_argument("--size", type=int, default=500)
+    parser.add_argument("--known", type=float, default=0.8, help="收錄於模擬資料庫的比例")
+    parser.add_argument("--rate-scale", type=float, default=1.0, help="速率上限放大倍數")
+    mock_providers.add_fault_arguments(parser)
+    args = parser.parse_args(argv)
+
+    for limits in scheduler.PROVIDER_LIMITS.values():
+        limits["rate"] *= args.rate_scale
+
+    records = mock_providers.corpus_records(f"{args.style}:{args.size}", args.known, args.seed)
+    server, url = mock_providers.start_server(records, mock_providers.config_from_args(args))
+    providers.configure(scopus_api_key="mock", serpapi_key="mock", api_base_url=url)
+
+    refs = corpus.generate_references(args.style, args.size, args.seed)
+    title_pairs = [(ref, scan_reference(ref).title) for ref in refs]
+    print(f"{args.style} × {args.size} 筆，模擬資料庫 {len(records)} 筆，伺服器 {url}，快取 {CACHE_DIR}")
+
+    try:
+        report("冷啟動", args.size, *run_once(title_pairs, server))
+        report("重跑（快取命中）", args.size, *run_once(title_pairs, server))
+    finally:
+        server.shutdown()
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+解析與分類吞吐量 benchmark：逐階段量測時間、每秒參考文獻數與記憶體峰值，並與 JSON baseline 比較
+
+    python benchmarks/bench_parsing.py                          # 預設 50 / 500 / 2000 筆
+    python benchmarks/bench_parsing.py --sizes 50 500 2000 10000 --save benchmarks/baselines/main.json
+    python benchmarks/bench_parsing.py --compare benchmarks/baselines/main.json
+
+階段（每個階段開始前清空 scan_reference / clean_title 快取，只量該階段本身）：
+- extract_docx / extract_pdf：擷取段落
+- find_section：找出參考文獻區段
+- merge_heads：PDF 斷行重組（merge_references_by_heads）
+- split_multi：一段含多筆參考文獻時的強制切分（split_multiple_apa_in_paragraph）
+- detect_style / extract_title：逐筆判斷格式與擷取標題
+- parse_docx / parse_pdf：完整解析流程（parse_document）
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import corpus  # noqa: E402
+from refcheck.normalize import clean_title  # noqa: E402
+from refcheck.parsing import (  # noqa: E402
+    extract_paragraphs_from_docx,
+    extract_paragraphs_from_pdf,
+    extract_reference_section,
+    merge_references_by_heads,
+    parse_document,
+    split_multiple_apa_in_paragraph,
+)
+from refcheck.rules import detect_reference_style, extract_title, scan_reference  # noqa: E402
+
+DEFAULT_SIZES = (50, 500, 2000)
+
+# 比前次 baseline 慢超過此比例視為退步
+DEFAULT_TOLERANCE = 0.20
+
+# 強制切分階段：每幾筆參考文獻擠在同一段
+REFS_PER_PARAGRAPH = 5
+
+
+def clear_caches():
+    scan_reference.cache_clear()
+    clean_title.cache_clear()
+
+
+def measure(fn, repeat):
+    """
+    先量時間（取最快的一次），再另外跑一次量 tracemalloc 峰值（tracemalloc 會拖慢速度）
+    """
+    best = None
+    for _ in range(repeat):
+        clear_caches()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    clear_caches()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def build_stages(style, size):
+    paragraphs = corpus.generate_document(style, size)
+    docx = corpus.build_docx(paragraphs)
+    pdf = corpus.build_pdf(paragraphs)
+    refs = corpus.generate_references(style, size)
+
+    docx_paragraphs = extract_paragraphs_from_docx(docx)
+    pdf_section = extract_reference_section(extract_paragraphs_from_pdf(pdf))[0]
+    crowded = [
+        " ".join(refs[i:i + REFS_PER_PARAGRAPH]) for i in range(0, len(refs), REFS_PER_PARAGRAPH)
+    ]
+    styles = [detect_reference_style(ref) for ref in refs]
+
+    return {
+        "extract_docx": lambda: extract_paragraphs_from_docx(docx),
+        "extract_pdf": lambda: extract_paragraphs_from_pdf(pdf),
+        "find_section": lambda: extract_reference_section(docx_paragraphs),
+        "merge_heads": lambda: merge_references_by_heads(pdf_section),
+        "split_multi": lambda: [split_multiple_apa_in_paragraph(p) for p in crowded],
+        "detect_style": lambda: [detect_reference_style(ref) for ref in refs],
+        "extract_title": lambda: [extract_title(ref, s) for ref, s in zip(refs, styles)],
+        "parse_docx": lambda: parse_document(f"{style}.docx", docx),
+        "parse_pdf": lambda: parse_document(f"{style}.pdf", pdf),
+    }
+
+
+def run(sizes, styles, repeat):
+    results = {}
+    for style in styles:
+        for size in sizes:
+            case = f"{style}/{size}"
+            results[case] = {}
+            for stage, fn in build_stages(style, size).items():
+                seconds, peak = measure(fn, repeat)
+                results[case][stage] = {
+                    "seconds": round(seconds, 6),
+                    "refs_per_s": round(size / seconds, 1) if seconds else None,
+                    "peak_kb": round(peak / 1024, 1),
+                }
+                print(
+                    f"{case:<16} {stage:<14} {seconds * 1000:>10.2f} ms "
+                    f"{size / seconds:>12,.0f} refs/s {peak / 1024 / 1024:>8.1f} MB",
+                    flush=True,
+                )
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """
+    回傳退步的 (case, stage, 倍數) 列表；兩邊都有的 case / stage 才比較
+    """
+    regressions = []
+    print(f"\n與 baseline（{baseline['meta'].get('revision')}）比較：")
+    for case, stages in results.items():
+        for stage, current in stages.items():
+            previous = baseline["results"].get(case, {}).get(stage)
+            if not previous or not previous["seconds"]:
+                continue
+            ratio = current["seconds"] / previous["seconds"]
+            flag = ""
+            if ratio > 1 + tolerance:
+                flag = "  ⚠️ 退步"
+                regressions.append((case, stage, ratio))
+            print(f"{case:<16} {stage:<14} {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="解析與分類吞吐量 benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--styles", nargs="+", default=list(corpus.STYLES), choices=corpus.STYLES)
+    parser.add_argument("--repeat", type=int, default=3, help="每個階段跑幾次取最快")
+    parser.add_argument("--save", help="結果寫入此 JSON（作為之後比較的 baseline）")
+    parser.add_argument("--compare", help="與此 JSON baseline 比較")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.styles, args.repeat)
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n結果已寫入 {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} 個階段比 baseline 慢超過 {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
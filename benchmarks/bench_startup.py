@@ -0,0 +1,101 @@
+"""
+啟動時間測試：每次都在新的 Python 行程中量測
+- 匯入 refcheck（Streamlit 介面、CLI 與每個解析行程啟動時都會匯入）的時間，以及因此載入的較重套件
+- 以 streamlit.testing 的 AppTest 執行 app.py：第一個元件（標題）出現前的時間與整頁執行時間（首次繪製）
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 10 --repo /tmp/refcheck-base   # 與其他版本比較
+
+比較其他版本時先以 git worktree 取出，例如 git worktree add /tmp/refcheck-base <commit>
+API 金鑰以假值提供；查詢快取、工作佇列寫入暫存目錄
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 載入與否會明顯影響啟動時間的套件
+HEAVY_MODULES = ("fitz", "pandas", "pyarrow", "numpy", "requests")
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import refcheck
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+PAINT_PROBE = """
+import json, sys, time
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+preloaded = set(sys.modules)
+marks = {}
+original_title = st.title
+
+def title(*args, **kwargs):
+    marks.setdefault("first_paint", time.perf_counter() - start)
+    return original_title(*args, **kwargs)
+
+st.title = title
+at = AppTest.from_file("app.py", default_timeout=120)
+at.secrets["scopus_api_key"] = "bench"
+at.secrets["serpapi_key"] = "bench"
+start = time.perf_counter()
+at.run()
+marks["script"] = time.perf_counter() - start
+marks["rerun"] = -time.perf_counter()
+at.run()
+marks["rerun"] += time.perf_counter()
+marks["loaded"] = [m for m in %r if m in sys.modules and m not in preloaded]
+marks["errors"] = [e.value for e in at.exception]
+print(json.dumps(marks))
+""" % (HEAVY_MODULES,)
+
+
+def run_probe(code, repo):
+    # 每次都用空的快取目錄，量到的是冷啟動
+    with tempfile.TemporaryDirectory(prefix="refcheck-startup-") as cache_dir:
+        env = dict(os.environ, PYTHONPATH=repo, REFCHECK_CACHE_DIR=cache_dir)
+        out = subprocess.run(
+            [sys.executable, "-c", code], cwd=repo, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def median_ms(samples, key):
+    return 1000 * statistics.median(sample[key] for sample in samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="量測匯入 refcheck 與 Streamlit 首次繪製的時間")
+    parser.add_argument("--repo", default=REPO_DIR, help="要量測的程式目錄（預設為目前的版本）")
+    parser.add_argument("--repeat", type=int, default=5, help="每項量測的次數（取中位數）")
+    parser.add_argument("--skip-app", action="store_true", help="只量測匯入時間")
+    args = parser.parse_args(argv)
+
+    repo = os.path.abspath(args.repo)
+    print(f"{repo}（各 {args.repeat} 次，取中位數）")
+
+    imports = [run_probe(IMPORT_PROBE, repo) for _ in range(args.repeat)]
+    print(f"  import refcheck    {median_ms(imports, 'seconds'):8.1f} ms  載入：{', '.join(imports[0]['loaded']) or '無'}")
+
+    if not args.skip_app:
+        paints = [run_probe(PAINT_PROBE, repo) for _ in range(args.repeat)]
+        print(f"  首次繪製（標題）   {median_ms(paints, 'first_paint'):8.1f} ms")
+        print(f"  整頁執行           {median_ms(paints, 'script'):8.1f} ms")
+        print(f"  rerun              {median_ms(paints, 'rerun'):8.1f} ms")
+        print(f"  app 載入：{', '.join(paints[0]['loaded']) or '無'}")
+        if paints[0]["errors"]:
+            print(f"  ⚠️ app.py 執行時發生例外：{paints[0]['errors']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+合成參考文獻語料：APA、APA_LIKE、IEEE 與中英混合書目，以及對應的 DOCX / PDF 檔
+
+    python benchmarks/corpus.py --out benchmarks/fixtures --sizes 50 500 2000 10000
+
+產生 {style}_{size}.docx / .pdf；同樣的 seed 產生同樣的內容
+"""
+import argparse
+import io
+import os
+import random
+import zipfile
+from xml.sax.saxutils import escape
+
+import fitz
+
+STYLES = ("apa", "apa_like", "ieee", "mixed")
+DEFAULT_SIZES = (50, 500, 2000, 10000)
+
+EN_SURNAMES = "Lin Chen Wang Smith Johnson Garcia Brown Lee Kim Nguyen Müller Rossi".split()
+EN_WORDS = (
+    "deep learning neural networks student engagement higher education systematic review "
+    "medical image segmentation transformer attention evaluation framework policy analysis "
+    "longitudinal study effects of on in for with and a the"
+).split()
+EN_JOURNALS = ["Computers & Education", "Nature", "IEEE Transactions on Learning Technologies", "PLOS ONE"]
+ZH_NAMES = "王小明 李大華 陳美玲 林志強 張雅婷 黃建國 吳佳穎 劉家豪".split()
+ZH_CHARS = "深度學習於教育之應用研究探討學生表現影響因素系統性回顧模型評估架構臺灣國民中小學教師專業發展"
+ZH_JOURNALS = ["教育研究集刊", "當代教育研究季刊", "師資培育與教師專業發展期刊", "資訊管理學報"]
+
+
+# ========== 單筆參考文獻 ==========
+def en_title(rng):
+    return " ".join(rng.choices(EN_WORDS, k=rng.randint(5, 14))).capitalize()
+
+
+def zh_title(rng):
+    return "".join(rng.choices(ZH_CHARS, k=rng.randint(8, 24)))
+
+
+def en_authors(rng):
+    names = [f"{rng.choice(EN_SURNAMES)}, {rng.choice('ABCDEFGHJKLM')}." for _ in range(rng.randint(1, 3))]
+    return names[0] if len(names) == 1 else ", ".join(names[:-1]) + ", & " + names[-1]
+
+
+def doi(rng):
+    return f"https://doi.org/10.{rng.randint(1000, 9999)}/{rng.choice('abcdefgh')}{rng.randint(10000, 99999)}"
+
+
+def apa_ref(rng):
+    year = rng.randint(1990, 2024)
+    ref = (
+        f"{en_authors(rng)} ({year}). {en_title(rng)}. {rng.choice(EN_JOURNALS)}, "
+        f"{rng.randint(1, 80)}({rng.randint(1, 12)}), {rng.randint(1, 300)}-{rng.randint(301, 600)}."
+    )
+    return ref + " " + doi(rng) if rng.random() < 0.6 else ref
+
+
+def apa_like_ref(rng):
+    year = rng.randint(1990, 2024)
+    return (
+        f"{en_authors(rng)}, {year}. {en_title(rng)}. {rng.choice(EN_JOURNALS)} "
+        f"{rng.randint(1, 80)}, {rng.randint(1, 300)}-{rng.randint(301, 600)}."
+    )
+
+
+def ieee_ref(rng, number):
+    return (
+        f'[{number}] {rng.choice("ABCDEFGHJKLM")}. {rng.choice(EN_SURNAMES)} and {rng.choice("ABCDEFGHJKLM")}. '
+        f'{rng.choice(EN_SURNAMES)}, "{en_title(rng)}," {rng.choice(EN_JOURNALS)}, vol. {rng.randint(1, 80)}, '
+        f'no. {rng.randint(1, 12)}, pp. {rng.randint(1, 300)}-{rng.randint(301, 600)}, {rng.randint(1990, 2024)}.'
+    )
+
+
+def zh_apa_ref(rng):
+    authors = "、".join(rng.sample(ZH_NAMES, rng.randint(1, 3)))
+    return (
+        f"{authors}（{rng.randint(1990, 2024)}）。{zh_title(rng)}。{rng.choice(ZH_JOURNALS)}，"
+        f"{rng.randint(1, 80)}({rng.randint(1, 4)})，{rng.randint(1, 100)}-{rng.randint(101, 200)}。"
+    )
+
+
+def generate_references(style, size, seed=0):
+    rng = random.Random(f"{style}:{size}:{seed}")
+    if style == "apa":
+        return [apa_ref(rng) for _ in range(size)]
+    if style == "apa_like":
+        return [apa_like_ref(rng) for _ in range(size)]
+    if style == "ieee":
+        return [ieee_ref(rng, i) for i in range(1, size + 1)]
+    if style == "mixed":
+        # 中文在前、英文在後（臺灣論文常見排法），英文中 APA 與 APA_LIKE 混用
+        zh_count = size // 3
+        refs = [zh_apa_ref(rng) for _ in range(zh_count)]
+        refs += [apa_ref(rng) if rng.random() < 0.7 else apa_like_ref(rng) for _ in range(size - zh_count)]
+        return refs
+    raise ValueError(f"unknown style: {style}")
+
+
+def generate_document(style, size, seed=0):
+    """
+    回傳 [(段落文字, 是否為標題)]：正文 → 參考文獻標題 → 參考文獻 → 附錄
+    """
+    rng = random.Random(f"body:{style}:{size}:{seed}")
+    body = []
+    for chapter in range(1, 6):
+        body.append((f"第{chapter}章 研究內容", True))
+        for _ in range(max(4, size // 25)):
+            if style == "mixed" or rng.random() < 0.3:
+                body.append(("".join(rng.choices(ZH_CHARS, k=rng.randint(60, 160))) + "。", False))
+            else:
+                body.append((" ".join(rng.choices(EN_WORDS, k=rng.randint(30, 80))).capitalize() + ".", False))
+    heading = "參考文獻" if style == "mixed" else "References"
+    refs = [(ref, False) for ref in generate_references(style, size, seed)]
+    appendix = [("附錄", True), ("訪談大綱與問卷題目。", False)]
+    return body + [(heading, True)] + refs + appendix
+
+
+# ========== DOCX ==========
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    '</Types>'
+)
+ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/></Relationships>'
+)
+DOCUMENT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/></Relationships>'
+)
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+STYLES_XML = (
+    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:styles xmlns:w="{W_NS}">'
+    '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/></w:style>'
+    '<w:style w:type="paragraph" w:styleId="Heading1"><w:name w:val="heading 1"/></w:style>'
+    '</w:styles>'
+)
+
+
+def build_docx(paragraphs):
+    body = []
+    for text, is_heading in paragraphs:
+        style = '<w:pPr><w:pStyle w:val="Heading1"/></w:pPr>' if is_heading else ""
+        body.append(f'<w:p>{style}<w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>')
+    document = (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:document xmlns:w="{W_NS}"><w:body>'
+        + "".join(body)
+        + "</w:body></w:document>"
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", CONTENT_TYPES)
+        zf.writestr("_rels/.rels", ROOT_RELS)
+        zf.writestr("word/_rels/document.xml.rels", DOCUMENT_RELS)
+        zf.writestr("word/styles.xml", STYLES_XML)
+        zf.writestr("word/document.xml", document)
+    return buffer.getvalue()
+
+
+# ========== PDF ==========
+PAGE_MARGIN = 50
+FONT_SIZE = 9
+
+
+def build_pdf(paragraphs):
+    """
+    每段依頁寬自動換行（與真實論文一樣，參考文獻會被切成多行），放不下時換頁
+    """
+    doc = fitz.open()
+    page = None
+    y = 0
+    for text, is_heading in paragraphs:
+        size = FONT_SIZE + 3 if is_heading else FONT_SIZE
+        for _ in range(2):
+            if page is None or y > page.rect.height - PAGE_MARGIN - 2 * size:
+                page = doc.new_page()
+                y = PAGE_MARGIN
+            bottom = page.rect.height - PAGE_MARGIN
+            rect = fitz.Rect(PAGE_MARGIN, y, page.rect.width - PAGE_MARGIN, bottom)
+            unused = page.insert_textbox(rect, text, fontsize=size, fontname="china-t")
+            if unused >= 0:
+                y = bottom - unused + size * 0.6
+                break
+            page = None  # 放不下，換頁再放一次
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def write_fixtures(out_dir, sizes=DEFAULT_SIZES, styles=STYLES, seed=0):
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for style in styles:
+        for size in sizes:
+            paragraphs = generate_document(style, size, seed)
+            for ext, build in (("docx", build_docx), ("pdf", build_pdf)):
+                path = os.path.join(out_dir, f"{style}_{size}.{ext}")
+                with open(path, "wb") as f:
+                    f.write(build(paragraphs))
+                paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="產生合成參考文獻的 DOCX / PDF 測試檔")
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--styles", nargs="+", default=list(STYLES), choices=STYLES)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    for path in write_fixtures(args.out, args.sizes, args.styles, args.seed):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+Crossref / Scopus / SerpAPI 的本地模擬伺服器：只回應程式實際讀取的欄位，資料來自 fixture，可設定延遲與錯誤
+
+    python benchmarks/mock_providers.py --corpus apa:500 --latency lognormal:120:0.5 --rate-429 scopus=0.05
+    python -m refcheck theses/ --api-base-url http://127.0.0.1:8765 --scopus-key x --serpapi-key x
+
+端點（同一個 port）：
+- Crossref   GET /works/{doi}、GET /works?filter=doi:...,doi:...
+- Scopus     GET /content/search/scopus?query=TITLE("...") OR TITLE("...")
+- SerpAPI    GET /search.json?engine=google_scholar&q=...、GET /account.json
+- 管理       GET /_stats（各來源請求數、429、5xx、額度用完次數）、GET /_reset（歸零計數與額度）
+
+fixture 為 JSONL，每行 {"title", "doi", "url", "scholar_title", "sources"}：
+sources 為此文獻能被哪些來源查到（crossref / scopus / scholar，預設全部），scholar_title 為 Google Scholar 顯示的標題
+（與 title 略有不同時可測相似比對）。--corpus 以 corpus.py 產生的參考文獻建立 fixture
+
+延遲、錯誤率與額度可對全部來源設定（--latency fixed:50），或以 來源=值 個別設定（--quota serpapi=200）
+同一個請求（路徑 + 參數 + 第幾次出現）的延遲與錯誤由 --seed 決定，與執行緒的先後順序無關
+測試時請另設 REFCHECK_CACHE_DIR，避免模擬結果寫入正式的查詢快取
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from refcheck.normalize import clean_title  # noqa: E402
+
+PROVIDERS = ("crossref", "scopus", "serpapi")
+# fixture 中 sources 欄位的值
+SOURCES = ("crossref", "scopus", "scholar")
+DEFAULT_PORT = 8765
+
+# --corpus 時，已知文獻有多少比例也收錄於 Scopus
+SCOPUS_COVERAGE = 0.6
+
+SCOPUS_QUOTA_STATUS = "QUOTA_EXCEEDED - Quota Exceeded"
+SERPAPI_QUOTA_ERROR = "Your account has run out of searches."
+
+
+# ========== 設定 ==========
+def parse_latency(spec):
+    """
+    fixed:MS、uniform:LO:HI、lognormal:MEDIAN:SIGMA（毫秒）→ 回傳 rng → 秒數 的函式
+    """
+    kind, *args = spec.split(":")
+    args = [float(a) for a in args]
+    if kind == "fixed" and len(args) == 1:
+        return lambda rng: args[0] / 1000
+    if kind == "uniform" and len(args) == 2:
+        return lambda rng: rng.uniform(args[0], args[1]) / 1000
+    if kind == "lognormal" and len(args) == 2:
+        mu = math.log(args[0])
+        return lambda rng: rng.lognormvariate(mu, args[1]) / 1000
+    raise ValueError(f"無法解析延遲設定：{spec}")
+
+
+def per_provider(values, convert, default):
+    """
+    ["0.1", "scopus=0.3"] → {"crossref": 0.1, "scopus": 0.3, "serpapi": 0.1}
+    """
+    result = dict.fromkeys(PROVIDERS, default)
+    specific = {}
+    for value in values or []:
+        provider, sep, rest = value.partition("=")
+        if not sep:
+            result = dict.fromkeys(PROVIDERS, convert(value))
+        elif provider in PROVIDERS:
+            specific[provider] = convert(rest)
+        else:
+            raise ValueError(f"未知的來源：{provider}")
+    result.update(specific)
+    return result
+
+
+class MockConfig:
+    """
+    latency：來源 → rng → 秒數；rate_429 / rate_5xx：錯誤比例；quota：可成功回應的次數（None 為不限）
+    """
+
+    def __init__(self, latency=None, rate_429=None, rate_5xx=None, quota=None, retry_after=1, seed=0):
+        self.latency = dict.fromkeys(PROVIDERS, None) | (latency or {})
+        self.rate_429 = dict.fromkeys(PROVIDERS, 0.0) | (rate_429 or {})
+        self.rate_5xx = dict.fromkeys(PROVIDERS, 0.0) | (rate_5xx or {})
+        self.quota = dict.fromkeys(PROVIDERS, None) | (quota or {})
+        self.retry_after = retry_after
+        self.seed = seed
+
+
+# ========== Fixture ==========
+def load_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def corpus_records(spec, known=0.8, seed=0):
+    """
+    spec 為 style:size（例如 apa:500）；其中 known 比例的參考文獻收錄於模擬資料庫
+    """
+    import corpus
+    from refcheck.rules import scan_reference
+
+    style, _, size = spec.partition(":")
+    rng = random.Random(f"mock:{spec}:{seed}")
+    records = []
+    for ref in corpus.generate_references(style, int(size or 500), seed):
+        if rng.random() >= known:
+            continue
+        scan = scan_reference(ref)
+        sources = ["scholar"]
+        if scan.doi:
+            sources.append("crossref")
+        if rng.random() < SCOPUS_COVERAGE:
+            sources.append("scopus")
+        records.append({
+            "title": scan.title,
+            "doi": scan.doi,
+            "url": f"https://doi.org/{scan.doi}" if scan.doi else None,
+            "sources": sources,
+        })
+    return records
+
+
+class MockDatabase:
+    def __init__(self, records):
+        self.by_doi = {}
+        self.scopus = {}
+        self.scholar = {}
+        for record in records:
+            sources = record.get("sources") or SOURCES
+            key = clean_title(record.get("title") or "")
+            if record.get("doi") and "crossref" in sources:
+                self.by_doi[record["doi"].lower()] = record
+            if key and "scopus" in sources:
+                self.scopus.setdefault(key, []).append(record)
+            if key and "scholar" in sources:
+                self.scholar.setdefault(key, record)
+
+    def crossref_item(self, record):
+        return {"DOI": record["doi"], "title": [record["title"]], "URL": record.get("url") or f"https://doi.org/{record['doi']}"}
+
+    def scholar_search(self, query, num):
+        """
+        標題完全相同者優先；否則找標題包含在查詢字串中的文獻（補救查詢以整筆參考文獻搜尋）
+        """
+        key = clean_title(query)
+        if key in self.scholar:
+            hits = [self.scholar[key]]
+        else:
+            hits = [record for title, record in self.scholar.items() if title and title in key]
+        return [
+            {"position": i + 1, "title": r.get("scholar_title") or r["title"], "link": r.get("url") or ""}
+            for i, r in enumerate(hits[:num])
+        ]
+
+
+# ========== 伺服器 ==========
+class MockState:
+    def __init__(self, records, config):
+        self.db = MockDatabase(records)
+        self.config = config
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.seen = {}
+            self.used = dict.fromkeys(PROVIDERS, 0)
+            self.stats = {
+                p: {"requests": 0, "ok": 0, "throttled": 0, "errors": 0, "quota_exceeded": 0, "latency_s": 0.0}
+                for p in PROVIDERS
+            }
+
+    def request_rng(self, request_key):
+        with self._lock:
+            n = self.seen.get(request_key, 0)
+            self.seen[request_key] = n + 1
+        return random.Random(f"{self.config.seed}:{request_key}:{n}")
+
+    def record(self, provider, field, latency=0.0):
+        with self._lock:
+            self.stats[provider]["requests"] += 1
+            self.stats[provider][field] += 1
+            self.stats[provider]["latency_s"] += latency
+
+    def consume_quota(self, provider):
+        with self._lock:
+            quota = self.config.quota[provider]
+            if quota is not None and self.used[provider] >= quota:
+                return False
+            self.used[provider] += 1
+            return True
+
+    def searches_left(self):
+        quota = self.config.quota["serpapi"]
+        return None if quota is None else max(0, quota - self.used["serpapi"])
+
+
+def route(path):
+    if path.startswith("/works"):
+        return "crossref"
+    if path.startswith("/content/search/scopus"):
+        return "scopus"
+    if path in ("/search.json", "/search"):
+        return "serpapi"
+    return None
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    state = None  # 由 start_server 設定
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        parsed = urllib.parse.urlsplit(self.path)
+        path = parsed.path
+        params = {k: v[-1] for k, v in urllib.parse.parse_qs(parsed.query).items()}
+        state = self.state
+
+        if path == "/_stats":
+            return self.send_json(200, state.stats)
+        if path == "/_reset":
+            state.reset()
+            return self.send_json(200, {"ok": True})
+        if path == "/account.json":
+            left = state.searches_left()
+            return self.send_json(200, {
+                "plan_searches_left": left if left is not None else 10 ** 6,
+                "total_searches_left": left if left is not None else 10 ** 6,
+                "this_month_usage": state.used["serpapi"],
+            })
+
+        provider = route(path)
+        if provider is None:
+            return self.send_json(404, {"error": "Not found"})
+
+        config = state.config
+        rng = state.request_rng(f"{provider}:{self.path}")
+        delay = config.latency[provider](rng) if config.latency[provider] else 0.0
+        if delay:
+            time.sleep(delay)
+
+        roll = rng.random()
+        if roll < config.rate_429[provider]:
+            state.record(provider, "throttled", delay)
+            return self.send_json(429, {"error": "Too Many Requests"}, {"Retry-After": str(config.retry_after)})
+        if roll < config.rate_429[provider] + config.rate_5xx[provider]:
+            state.record(provider, "errors", delay)
+            return self.send_json(rng.choice((500, 502, 503)), {"error": "Internal Server Error"})
+        if not state.consume_quota(provider):
+            state.record(provider, "quota_exceeded", delay)
+            if provider == "serpapi":
+                return self.send_json(429, {"error": SERPAPI_QUOTA_ERROR})
+            return self.send_json(429, {"error-response": {"error-code": "QUOTA_EXCEEDED"}}, {
+                "X-ELS-Status": SCOPUS_QUOTA_STATUS, "X-RateLimit-Remaining": "0",
+            })
+
+        state.record(provider, "ok", delay)
+        handler = {"crossref": self.crossref, "scopus": self.scopus, "serpapi": self.serpapi}[provider]
+        return handler(path, params)
+
+    # ---------- Crossref ----------
+    def crossref(self, path, params):
+        db = self.state.db
+        if path.startswith("/works/"):
+            record = db.by_doi.get(urllib.parse.unquote(path[len("/works/"):]).lower())
+            if record is None:
+                data = b"Resource not found."
+                self.send_response(404)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                return self.wfile.write(data)
+            return self.send_json(200, {"status": "ok", "message": db.crossref_item(record)})
+
+        dois = [part.strip()[len("doi:"):] for part in params.get("filter", "").split(",") if part.strip().startswith("doi:")]
+        items = [db.crossref_item(db.by_doi[d.lower()]) for d in dois if d.lower() in db.by_doi]
+        rows = int(params.get("rows", 20))
+        return self.send_json(200, {"status": "ok", "message": {"total-results": len(items), "items": items[:rows]}})
+
+    # ---------- Scopus ----------
+    def scopus(self, path, params):
+        if not self.headers.get("X-ELS-APIKey"):
+            return self.send_json(401, {"service-error": {"status": {"statusCode": "AUTHENTICATION_ERROR"}}})
+        query = params.get("query", "")
+        titles = re.findall(r'TITLE\("(.*?)"\)(?=\s+OR\s+TITLE\(|\s*$)', query)
+        if not titles:
+            return self.send_json(400, {"service-error": {"status": {"statusCode": "INVALID_INPUT"}}})
+
+        matches = []
+        for title in titles:
+            matches.extend(self.state.db.scopus.get(clean_title(title), []))
+        count = int(params.get("count", 25))
+        entries = [
+            {"dc:title": r["title"], "prism:url": r.get("url") or "https://www.scopus.com"}
+            for r in matches[:count]
+        ] or [{"@_fa": "true", "error": "Result set was empty"}]
+        return self.send_json(200, {"search-results": {
+            "opensearch:totalResults": str(len(matches)),
+            "entry": entries,
+        }})
+
+    # ---------- SerpAPI ----------
+    def serpapi(self, path, params):
+        if not params.get("api_key"):
+            return self.send_json(401, {"error": "Invalid API key. Your API key should be here: https://serpapi.com/manage-api-key"})
+        if params.get("engine") != "google_scholar":
+            return self.send_json(400, {"error": "Unsupported `engine` parameter."})
+        organic = self.state.db.scholar_search(params.get("q", ""), int(params.get("num", 10)))
+        body = {"search_metadata": {"status": "Success"}, "organic_results": organic}
+        if not organic:
+            body["search_information"] = {"organic_results_state": "Fully empty"}
+        return self.send_json(200, body)
+
+
+def start_server(records, config=None, host="127.0.0.1", port=0):
+    """
+    在背景執行緒啟動伺服器；port=0 時自動選擇。回傳 (server, base_url)，用完呼叫 server.shutdown()
+    """
+    handler = type("BoundMockHandler", (MockHandler,), {"state": MockState(records, config or MockConfig())})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = handler.state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+# ========== 命令列 ==========
+def add_fault_arguments(parser):
+    parser.add_argument("--latency", action="append", help="fixed:MS / uniform:LO:HI / lognormal:MEDIAN:SIGMA，可加 來源= 前綴")
+    parser.add_argument("--rate-429", action="append", help="回應 429 的比例，例如 0.05 或 scopus=0.1")
+    parser.add_argument("--rate-5xx", action="append", help="回應 500/502/503 的比例")
+    parser.add_argument("--quota", action="append", help="可成功回應的次數，之後回應額度用完，例如 serpapi=200")
+    parser.add_argument("--retry-after", type=int, default=1, help="429 回應的 Retry-After 秒數")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def config_from_args(args):
+    return MockConfig(
+        latency=per_provider(args.latency, parse_latency, None),
+        rate_429=per_provider(args.rate_429, float, 0.0),
+        rate_5xx=per_provider(args.rate_5xx, float, 0.0),
+        quota=per_provider(args.quota, int, None),
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crossref / Scopus / SerpAPI 本地模擬伺服器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--fixtures", help="JSONL fixture")
+    parser.add_argument("--corpus", help="以 corpus.py 產生 fixture，格式 style:size（例如 mixed:2000）")
+    parser.add_argument("--known", type=float, default=0.8, help="--corpus 時收錄於模擬資料庫的比例")
+    add_fault_arguments(parser)
+    args = parser.parse_args(argv)
+
+    records = load_records(args.fixtures) if args.fixtures else []
+    if args.corpus:
+        records += corpus_records(args.corpus, args.known, args.seed)
+    server, url = start_server(records, config_from_args(args), args.host, args.port)
+    print(f"模擬伺服器：{url}（{len(records)} 筆文獻），Ctrl+C 結束", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
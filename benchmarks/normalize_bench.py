@@ -0,0 +1,121 @@
+"""
+標題正規化：查表版（refcheck.normalize）與原本逐字元寫法的一致性檢查與吞吐量
+
+    python benchmarks/normalize_bench.py [--titles 100000] [--fuzz 200000] [--seed 0]
+
+- 一致性：隨機 Unicode 字串（各類別、組合字元、全形、dash、數字）兩種寫法輸出必須完全相同
+- 吞吐量：10 萬筆中英文標題，分別量測第一次（未命中快取）與重複正規化（命中快取）的速度
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+import unicodedata
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from refcheck import normalize  # noqa: E402
+
+
+# ========== 原本的寫法（對照組） ==========
+def reference_clean_title(text):
+    dash_variants = ["-", "–", "—", "−", "‑", "‐"]
+    for d in dash_variants:
+        text = text.replace(d, "")
+    text = unicodedata.normalize('NFKC', text)
+    cleaned = []
+    for ch in text:
+        if unicodedata.category(ch)[0] in ("L", "N", "Z"):
+            cleaned.append(ch.lower())
+    return re.sub(r'\s+', ' ', ''.join(cleaned)).strip()
+
+
+def reference_clean_title_for_remedial(text):
+    text = unicodedata.normalize('NFKC', text)
+    dash_variants = ["-", "–", "—", "−", "‑", "‐"]
+    for d in dash_variants:
+        text = text.replace(d, "")
+    text = re.sub(r'\b\d+\b', '', text)
+    cleaned = []
+    for ch in text:
+        if unicodedata.category(ch)[0] in ("L", "N", "Z"):
+            cleaned.append(ch.lower())
+    return re.sub(r'\s+', ' ', ''.join(cleaned)).strip()
+
+
+# ========== 隨機字串 ==========
+# 容易出錯的字元：dash、組合字元、全形、相容字元、大小寫特例、各種空白與控制字元
+TRICKY = (
+    "-–—−‑‐﹣－‒―" "̸́̈" "ＡＢＣａｂｃ１２３（）．，" "ﬁﬂ№™①Ⅻ㎏"
+    "İΣσςẞß" "  　\t\n\r​  \x85" "0123456789" "深度學習研究之"
+)
+
+
+def random_text(rng):
+    chars = []
+    for _ in range(rng.randint(0, 40)):
+        kind = rng.random()
+        if kind < 0.4:
+            chars.append(rng.choice(TRICKY))
+        elif kind < 0.7:
+            chars.append(rng.choice("abcdefghijklmnopqrstuvwxyz ABCDEFG.,:;'\"()[]"))
+        else:
+            chars.append(chr(rng.randint(0x20, 0x2FFFF)))
+    return "".join(chars)
+
+
+def random_title(rng):
+    words = "deep learning analysis of student performance in higher education 2020 vol 12 a review".split()
+    if rng.random() < 0.5:
+        title = " ".join(rng.choices(words, k=rng.randint(5, 16)))
+        return title.title() + rng.choice([".", ":", " — part 2", " (2021)", ""])
+    return "".join(rng.choices("深度學習於醫學影像分析之應用研究：以臺灣為例（二）", k=rng.randint(8, 40)))
+
+
+def check_equivalence(rng, n):
+    mismatches = 0
+    for _ in range(n):
+        text = random_text(rng)
+        if normalize.clean_title(text) != reference_clean_title(text):
+            mismatches += 1
+        if normalize.clean_title_for_remedial(text) != reference_clean_title_for_remedial(text):
+            mismatches += 1
+    return mismatches
+
+
+def timed(fn, titles):
+    start = time.perf_counter()
+    fn(titles)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--titles", type=int, default=100_000)
+    parser.add_argument("--fuzz", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    mismatches = check_equivalence(rng, args.fuzz)
+    print(f"一致性：{args.fuzz} 組隨機字串，輸出不同 {mismatches} 組")
+
+    titles = [random_title(rng) + f" {i}" for i in range(args.titles)]
+    baseline = timed(lambda ts: [reference_clean_title(t) for t in ts], titles)
+    normalize.clean_title.cache_clear()
+    cold = timed(normalize.clean_titles, titles)
+    # 重複正規化：同一批標題在比對過程中反覆清洗（工作集小於快取容量）
+    repeated = titles[:args.titles // 10] * 10
+    normalize.clean_titles(repeated)
+    warm = timed(normalize.clean_titles, repeated)
+    print(f"吞吐量：{args.titles} 筆標題")
+    print(f"  原本寫法        {args.titles / baseline:>12,.0f} 筆/秒")
+    print(f"  查表（未快取）  {args.titles / cold:>12,.0f} 筆/秒  ({baseline / cold:.1f}x)")
+    print(f"  查表（已快取）  {args.titles / warm:>12,.0f} 筆/秒  ({baseline / warm:.1f}x)")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
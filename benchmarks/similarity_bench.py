@@ -0,0 +1,87 @@
+"""
+標題相似度 micro-benchmark：refcheck.similarity 與原本逐筆 SequenceMatcher 的分類結果與速度比較
+
+    python benchmarks/similarity_bench.py [--pairs 20000] [--threshold 0.9] [--seed 0]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from refcheck.similarity import SCORERS, score_many  # noqa: E402
+
+EN_WORDS = (
+    "deep learning neural network analysis of the effects on student performance in higher "
+    "education a systematic review and meta approach for medical image segmentation using "
+    "transformer models with attention mechanisms evaluation framework"
+).split()
+CJK_CHARS = "深度學習於醫學影像分析之應用研究探討教育學生表現影響因素系統性回顧模型評估架構臺灣國民中小學"
+
+
+def random_title(rng):
+    if rng.random() < 0.5:
+        return " ".join(rng.choices(EN_WORDS, k=rng.randint(4, 30)))
+    return "".join(rng.choices(CJK_CHARS, k=rng.randint(8, 120)))
+
+
+def mutate(rng, text):
+    # 模擬 Scholar 回傳的標題：不相關、完全相同、只差幾個字
+    kind = rng.random()
+    if kind < 0.5:
+        return random_title(rng)
+    if kind < 0.7:
+        return text
+    chars = list(text)
+    for _ in range(rng.randint(0, max(1, len(chars) // 8))):
+        if not chars:
+            break
+        i = rng.randrange(len(chars))
+        op = rng.random()
+        if op < 0.4:
+            del chars[i]
+        elif op < 0.7:
+            chars.insert(i, rng.choice(CJK_CHARS + "abcdefg "))
+        else:
+            chars[i] = rng.choice(CJK_CHARS + "abcdefg ")
+    return "".join(chars)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pairs", type=int, default=20000)
+    parser.add_argument("--threshold", type=float, default=0.90)
+    parser.add_argument("--candidates", type=int, default=3, help="每個查詢的候選數（Scholar 取 3 筆）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    queries = [random_title(rng) for _ in range(args.pairs // args.candidates)]
+    batches = [[mutate(rng, q) for _ in range(args.candidates)] for q in queries]
+
+    start = time.perf_counter()
+    baseline = [
+        [SequenceMatcher(None, q, c).ratio() >= args.threshold for c in cands]
+        for q, cands in zip(queries, batches)
+    ]
+    baseline_time = time.perf_counter() - start
+    positives = sum(map(sum, baseline))
+    print(f"{len(queries) * args.candidates} 組標題，門檻 {args.threshold}，達標 {positives} 組")
+    print(f"  SequenceMatcher  {baseline_time:.3f}s")
+
+    for name in SCORERS:
+        start = time.perf_counter()
+        results = [
+            [score >= args.threshold for score in score_many(q, cands, args.threshold, scorer=name)]
+            for q, cands in zip(queries, batches)
+        ]
+        elapsed = time.perf_counter() - start
+        diff = sum(a != b for row_a, row_b in zip(baseline, results) for a, b in zip(row_a, row_b))
+        print(f"  {name:<16} {elapsed:.3f}s  ({baseline_time / elapsed:.1f}x)  分類不同：{diff}")
+
+
+if __name__ == "__main__":
+    main()
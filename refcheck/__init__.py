@@ -0,0 +1,26 @@
+"""
+Reference Checker 核心函式庫：文件解析、參考文獻切分與標題擷取、Crossref / Scopus / Google Scholar 查詢
+Streamlit 介面（app.py）與命令列工具（python -m refcheck）共用
+"""
+
+from .parsing import (
+    extract_paragraphs,
+    extract_paragraphs_from_docx,
+    extract_paragraphs_from_pdf,
+    extract_reference_section,
+    merge_reference_section,
+    parse_document,
+    split_references,
+)
+from .normalize import clean_title, clean_title_for_remedial, clean_titles, clean_titles_for_remedial
+from .pipeline import LookupDedupe, check_documents, lookup_file, new_file_results, prefetch_lookups
+from .providers import configure, lookup_reference
+from .report import build_csv, build_export_rows, build_json, summarize
+from .results import FileResults, ReferenceResult, Status
+from .rules import (
+    ReferenceScan,
+    detect_reference_style,
+    extract_doi,
+    extract_title,
+    scan_reference,
+)
@@ -0,0 +1,166 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from . import metrics, providers
+from .ingest import record_parse
+from .parallel import submit_parse
+from .parsing import SUPPORTED_EXTENSIONS
+from .pipeline import LookupDedupe, check_file, now_str, prefetch_lookups, results_from_parsed
+from .report import build_csv, build_json, summarize
+from .title_index import export_verified_titles, get_title_index
+
+
+def expand_inputs(inputs):
+    """
+    目錄（遞迴）、glob 或單一檔案 → 排序後的 .docx / .pdf 路徑列表
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, names in os.walk(item):
+                paths.extend(os.path.join(root, name) for name in names)
+        elif glob.has_magic(item):
+            paths.extend(glob.glob(item, recursive=True))
+        else:
+            paths.append(item)
+
+    supported = [
+        p for p in paths
+        if os.path.isfile(p) and p.rsplit(".", 1)[-1].lower() in SUPPORTED_EXTENSIONS
+        and not os.path.basename(p).startswith("~$")  # Word 暫存檔
+    ]
+    return sorted(dict.fromkeys(supported))
+
+
+def collect_parsed(path, job):
+    """
+    取得解析結果
+    回傳 (檔案結果或 None, digest, 錯誤訊息)；需要查詢的檔案才有 digest
+    """
+    try:
+        parsed, usage = job.result()
+        record_parse(path, usage)
+        file_results = results_from_parsed(path, parsed, usage)
+        needs_lookup = file_results is not None and parsed is not None and parsed["matched_section"]
+        return file_results, parsed["digest"] if needs_lookup else None, None
+    except Exception as e:
+        return None, None, f"{type(e).__name__}: {e}"
+
+
+def check_parsed(path, file_results, digest, dedupe):
+    """
+    查詢已解析的檔案（呼叫端已執行 prefetch_lookups）；重複的參考文獻沿用先前檔案的結果
+    回傳 (檔案結果列表, 錯誤訊息)
+    """
+    if file_results is None:
+        return [], None
+    if digest is None:
+        return [file_results], None
+    try:
+        return [check_file(file_results, digest, dedupe=dedupe, prefetch=False)[0]], None
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="refcheck",
+        description="批次查核 Word / PDF 論文的參考文獻（Crossref、Scopus、Google Scholar）",
+    )
+    parser.add_argument("inputs", nargs="+", help="檔案、目錄或 glob（例如 'theses/**/*.pdf'）")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1, help="解析用的 worker 行程數")
+    parser.add_argument("--csv", default="reference_results.csv", help="CSV 報告輸出路徑")
+    parser.add_argument("--json", help="JSON 報告輸出路徑（選填）")
+    parser.add_argument("--scopus-key", help="Scopus API Key（預設讀 SCOPUS_API_KEY 或 scopus_key.txt）")
+    parser.add_argument("--serpapi-key", help="SerpAPI Key（預設讀 SERPAPI_KEY 或 serpapi_key.txt）")
+    parser.add_argument("--mailto", default=os.environ.get("CROSSREF_MAILTO", ""), help="Crossref polite pool Email")
+    parser.add_argument(
+        "--title-index", default=os.environ.get("REFCHECK_TITLE_INDEX", ""),
+        help="本地標題索引快照（JSONL / CSV，欄位 title、url、source），命中時不呼叫 Scopus / SerpAPI",
+    )
+    parser.add_argument("--save-verified", help="將本次標題命中的參考文獻附加到此 JSONL 快照（選填）")
+    parser.add_argument("--metrics", help="將效能統計以 Prometheus 文字格式寫入此檔（例如 node_exporter textfile）")
+    parser.add_argument(
+        "--metrics-port", type=int, default=metrics.METRICS_PORT,
+        help="執行期間以 Prometheus 格式在此 port 提供 /metrics",
+    )
+    parser.add_argument(
+        "--metrics-host", default=metrics.METRICS_HOST,
+        help="/metrics 監聽的位址（預設只限本機；0.0.0.0 開放其他主機）",
+    )
+    parser.add_argument(
+        "--api-base-url", default=None,
+        help="改將 Crossref / Scopus / SerpAPI 請求送到此 URL（例如本地模擬伺服器 http://127.0.0.1:8765）",
+    )
+    args = parser.parse_args(argv)
+
+    keys = {
+        "scopus": args.scopus_key or providers.API_KEYS["scopus"] or providers.read_key_file("scopus_key.txt"),
+        "serpapi": args.serpapi_key or providers.API_KEYS["serpapi"] or providers.read_key_file("serpapi_key.txt"),
+    }
+    missing = [name for name, key in keys.items() if not key]
+    if missing:
+        parser.error(f"找不到 API 金鑰：{', '.join(missing)}")
+
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        parser.error("沒有找到任何 .docx 或 .pdf 檔案")
+
+    providers.configure(
+        scopus_api_key=keys["scopus"], serpapi_key=keys["serpapi"], crossref_mailto=args.mailto,
+        title_index=args.title_index, api_base_url=args.api_base_url,
+    )
+    get_title_index()
+    metrics.serve_prometheus(args.metrics_port, args.metrics_host)
+
+    # 解析在 worker 行程中進行（直接以路徑開檔）；查詢在主行程，所有檔案共用同一組速率限制與去重結果
+    workers = max(1, min(args.workers, len(paths)))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        jobs = [(path, submit_parse(pool, path, path, workers=workers)) for path in paths]
+        parsed_files = [(path, *collect_parsed(path, job)) for path, job in jobs]
+
+    # 所有檔案的 DOI 與標題一起批次預查，逐檔查詢時直接由快取命中
+    with metrics.stage("prefetch"):
+        prefetch_lookups([file_results for _, file_results, digest, _ in parsed_files if digest])
+
+    all_results = []
+    failed = 0
+    dedupe = LookupDedupe()
+    for i, (path, file_results, digest, error) in enumerate(parsed_files, 1):
+        if not error:
+            results, error = check_parsed(path, file_results, digest, dedupe)
+        if error:
+            failed += 1
+            print(f"[{i}/{len(paths)}] ❌ {path}：{error}", file=sys.stderr)
+            continue
+        refs = sum(len(r.references) for r in results)
+        print(f"[{i}/{len(paths)}] {path}：{refs} 篇參考文獻", file=sys.stderr)
+        all_results.extend(results)
+
+    report_time = now_str()
+    run_metrics = metrics.snapshot() if metrics.METRICS_ENABLED else None
+    with open(args.csv, "w", encoding="utf-8-sig", newline="") as f:
+        f.write(build_csv(all_results, report_time, metrics=run_metrics))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            f.write(build_json(all_results, report_time, lookup_stats=dedupe.stats(), metrics=run_metrics))
+    if args.metrics and run_metrics is not None:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            f.write(metrics.prometheus_text(run_metrics))
+    if args.save_verified:
+        saved = export_verified_titles(all_results, args.save_verified)
+        print(f"已將 {saved} 筆命中標題附加到 {args.save_verified}", file=sys.stderr)
+
+    summary = summarize(all_results)
+    print(
+        f"完成：{summary['total_files']} 篇論文、{summary['total_refs']} 篇參考文獻，"
+        f"查無結果 {summary['not_found']} 篇；重複文獻省下 {dedupe.saved} 次查詢；報告已寫入 {args.csv}",
+        file=sys.stderr,
+    )
+    if summary["serpapi_exceeded"]:
+        print(f"⚠️ SerpAPI 額度不足，{summary['serpapi_exceeded']} 篇未查完 Google Scholar", file=sys.stderr)
+    return 1 if failed else 0
@@ -0,0 +1,124 @@
+import hashlib
+import os
+
+from .lookup_cache import get_cache
+from .metrics import count_cache
+from .results import FileResults, Status
+
+
+# ========== 整份文件的快取 ==========
+# 以上傳檔內容的 SHA-256 為 key，存解析結果與查核結果；重新按「開始查詢」或多加一個檔案時，
+# 內容相同的檔案不必重新解析與查詢。資料存在查詢快取（SQLite）中，同一台 server 的所有 session 共用
+DOCUMENT_CACHE_ENABLED = os.environ.get("REFCHECK_DOCUMENT_CACHE", "1") != "0"
+
+# 快取格式有變動時調整
+DOCUMENT_CACHE_FORMAT = 2
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 擷取規則：這些檔案內容變動時，解析結果自動失效
+EXTRACTION_MODULES = ("parsing.py", "rules.py", "normalize.py")
+# 查核流程：這些檔案（或擷取規則）變動時，查核結果自動失效
+CLASSIFICATION_MODULES = (
+    "pipeline.py", "providers.py", "results.py", "routing.py", "serpapi_budget.py", "similarity.py", "title_index.py",
+)
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def source_version(names):
+    h = hashlib.sha256(str(DOCUMENT_CACHE_FORMAT).encode())
+    for name in names:
+        h.update(name.encode())
+        with open(os.path.join(PACKAGE_DIR, name), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+RULES_VERSION = source_version(EXTRACTION_MODULES)
+LOOKUP_VERSION = source_version(EXTRACTION_MODULES + CLASSIFICATION_MODULES)
+
+
+def lookup_version():
+    """
+    查核結果的版本：程式版本加上執行時可變更的設定（本地索引快照、API 位址、路由與相似度設定）
+    設定可能在匯入後才改（例如 CLI 參數、Streamlit secrets），每次取 key 時重新計算
+    """
+    # 解析行程不會用到查核結果，需要時才載入 requests 等套件
+    from . import http_client, routing, similarity, title_index
+
+    snapshot = title_index.TITLE_INDEX_SNAPSHOT
+    config = [
+        LOOKUP_VERSION,
+        title_index.snapshot_signature(snapshot) if snapshot and os.path.exists(snapshot) else "",
+        *sorted(http_client.PROVIDER_BASE_URLS.items()),
+        routing.ROUTING_MODE,
+        similarity.SIMILARITY_SCORER,
+    ]
+    return hashlib.sha256(repr(config).encode()).hexdigest()[:16]
+
+
+def content_digest(source):
+    """
+    source 為路徑、bytes 或 file-like 物件（讀完後回到開頭）
+    """
+    h = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray)):
+        h.update(source)
+    elif isinstance(source, str):
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+                h.update(chunk)
+    else:
+        source.seek(0)
+        for chunk in iter(lambda: source.read(HASH_CHUNK_BYTES), b""):
+            h.update(chunk)
+        source.seek(0)
+    return h.hexdigest()
+
+
+# ========== 解析結果 ==========
+def load_parsed(digest, file_ext):
+    if not DOCUMENT_CACHE_ENABLED:
+        return None
+    hit, _, parsed = get_cache().get("document_parse", f"{RULES_VERSION}:{file_ext}:{digest}")
+    if not hit:
+        return None
+    # JSON 會把 tuple 存成 list
+    parsed["groups"] = [(para, years, refs) for para, years, refs in parsed["groups"]]
+    parsed["title_pairs"] = [tuple(pair) for pair in parsed["title_pairs"]]
+    return parsed
+
+
+def save_parsed(digest, file_ext, parsed):
+    if DOCUMENT_CACHE_ENABLED:
+        get_cache().set("document_parse", f"{RULES_VERSION}:{file_ext}:{digest}", parsed)
+
+
+# ========== 查核結果 ==========
+def load_file_results(digest):
+    """
+    回傳 (檔案結果, Google Scholar 查詢紀錄)；沒有快取時回傳 None
+    """
+    if not DOCUMENT_CACHE_ENABLED or not digest:
+        return None
+    hit, _, payload = get_cache().get("document_results", f"{lookup_version()}:{digest}")
+    count_cache("document_results", hit)
+    if not hit:
+        return None
+    return FileResults.from_dict(payload["results"]), payload["logs"]
+
+
+def save_file_results(digest, file_results, scholar_logs):
+    """
+    有查無結果的參考文獻時可能是暫時的錯誤（例如 API 額度用完），只短暫快取
+    因 SerpAPI 額度不足而未查完的參考文獻（含略過的補救查詢）不快取，額度恢復後重新查詢
+    """
+    if not DOCUMENT_CACHE_ENABLED or not digest or file_results.counts[Status.SERPAPI_EXCEEDED]:
+        return
+    get_cache().set(
+        "document_results",
+        f"{lookup_version()}:{digest}",
+        {"results": file_results.to_dict(), "logs": scholar_logs},
+        ok=not file_results.counts[Status.NOT_FOUND],
+    )
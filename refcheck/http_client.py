@@ -0,0 +1,160 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import count_retry, observe_call
+from .scheduler import PROVIDER_LIMITS, provider_slot
+
+
+# ========== 連線設定 ==========
+# timeout 為 (connect, read) 秒數；retries 為失敗後最多重試次數
+PROVIDER_HTTP = {
+    "crossref": {"timeout": (5, 20), "retries": 3},
+    "scopus": {"timeout": (5, 20), "retries": 3},
+    "serpapi": {"timeout": (5, 40), "retries": 2},
+}
+DEFAULT_HTTP = {"timeout": (5, 20), "retries": 2}
+
+# 遇到這些狀態碼才重試（限速與伺服器端錯誤）
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# 指數退避：BACKOFF_BASE * 2^n 秒，加上隨機 jitter，最長 BACKOFF_MAX 秒
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+
+# ========== 查詢端點 ==========
+# 預設為正式 API；可改指向本地模擬伺服器（benchmarks/mock_providers.py）做壓力測試
+# REFCHECK_API_BASE_URL 一次覆寫全部來源，個別來源可再用 REFCHECK_{CROSSREF,SCOPUS,SERPAPI}_URL 覆寫
+DEFAULT_BASE_URLS = {
+    "crossref": "https://api.crossref.org",
+    "scopus": "https://api.elsevier.com",
+    "serpapi": "https://serpapi.com",
+}
+PROVIDER_BASE_URLS = {
+    provider: (
+        os.environ.get(f"REFCHECK_{provider.upper()}_URL")
+        or os.environ.get("REFCHECK_API_BASE_URL")
+        or url
+    ).rstrip("/")
+    for provider, url in DEFAULT_BASE_URLS.items()
+}
+
+# Crossref polite pool：附上聯絡 Email 可避免被限速
+CROSSREF_MAILTO = os.environ.get("CROSSREF_MAILTO", "")
+USER_AGENT = "reference-checker/1.0 (+https://github.com/pauline-chou/reference-checker)"
+
+
+def set_base_url(url, provider=None):
+    """
+    provider 為 None 時所有來源都改用此 URL；url 為空字串時恢復正式 API
+    """
+    for name in ([provider] if provider else DEFAULT_BASE_URLS):
+        PROVIDER_BASE_URLS[name] = (url or DEFAULT_BASE_URLS[name]).rstrip("/")
+
+
+def endpoint(provider, path):
+    return PROVIDER_BASE_URLS[provider] + path
+
+
+def set_crossref_mailto(email):
+    global CROSSREF_MAILTO
+    CROSSREF_MAILTO = (email or "").strip()
+
+
+# ========== Session（每個查詢來源一個連線池） ==========
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(provider):
+    with _sessions_lock:
+        session = _sessions.get(provider)
+        if session is None:
+            pool_size = PROVIDER_LIMITS.get(provider, {}).get("concurrency", 4)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            _sessions[provider] = session
+        return session
+
+
+def retry_after_seconds(response):
+    """
+    解析 Retry-After 標頭（秒數或 HTTP 日期），無法解析則回傳 None
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_seconds(attempt):
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(delay / 2, delay)
+
+
+# ========== 發送請求 ==========
+def get(provider, url, params=None, headers=None):
+    """
+    透過共用連線池送出 GET，每次嘗試都受 provider_slot 的併發與速率限制
+    - 429 / 5xx / 連線錯誤會以指數退避 + jitter 重試，有 Retry-After 時依其等待
+    - 重試用完後回傳最後一次的 response；若最後一次是連線錯誤則拋出例外
+    """
+    config = PROVIDER_HTTP.get(provider, DEFAULT_HTTP)
+    session = get_session(provider)
+    params = dict(params or {})
+    if provider == "crossref" and CROSSREF_MAILTO:
+        params.setdefault("mailto", CROSSREF_MAILTO)
+
+    attempt = 0
+    while True:
+        if attempt:
+            count_retry(provider)
+        try:
+            with provider_slot(provider):
+                # 延遲只計算請求本身，不含等待併發與速率限制的時間
+                start = time.perf_counter()
+                try:
+                    response = session.get(url, params=params, headers=headers, timeout=config["timeout"])
+                except (requests.ConnectionError, requests.Timeout):
+                    observe_call(provider, time.perf_counter() - start, None)
+                    raise
+                observe_call(provider, time.perf_counter() - start, response.status_code)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt >= config["retries"]:
+                raise
+            time.sleep(backoff_seconds(attempt))
+            attempt += 1
+            continue
+
+        if response.status_code not in RETRY_STATUS or attempt >= config["retries"]:
+            return response
+
+        wait = retry_after_seconds(response)
+        time.sleep(min(BACKOFF_MAX, wait) if wait is not None else backoff_seconds(attempt))
+        attempt += 1
+
+
+def serpapi_search(params):
+    """
+    直接呼叫 SerpAPI JSON 端點（取代 GoogleSearch，以便共用連線池與重試）
+    回傳值與 GoogleSearch(params).get_dict() 相同：錯誤時含 "error" 欄位
+    """
+    response = get("serpapi", endpoint("serpapi", "/search.json"), params=dict(params, output="json"))
+    try:
+        return response.json()
+    except ValueError:
+        return {"error": f"SerpAPI 回應無法解析（HTTP {response.status_code}）"}
@@ -0,0 +1,134 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from .document_cache import content_digest, load_parsed, save_parsed
+from .metrics import capture_stages, count_cache, record_file_stages
+from .parsing import parse_document
+
+
+# ========== 記憶體設定 ==========
+# 每次查詢（一個 job）解析階段可用的記憶體上限，由各解析行程平分
+MEMORY_BUDGET_MB = int(os.environ.get("REFCHECK_MEMORY_BUDGET_MB", 768))
+
+# 上傳檔寫入暫存檔時每次複製的大小
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+
+class MemoryBudgetExceeded(MemoryError):
+    pass
+
+
+def current_rss_mb():
+    """
+    目前行程的常駐記憶體（Linux 讀 /proc；其他平台退回峰值）
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 單位為 KB，macOS 為 bytes
+    return peak / (1024 * 1024) if peak > 1 << 32 else peak / 1024
+
+
+class MemoryBudget:
+    """
+    解析過程中定期呼叫 check()：記錄峰值，超過上限時拋出 MemoryBudgetExceeded
+    上限與峰值皆為開始解析後增加的記憶體（扣除建立時的常駐記憶體），
+    在 Streamlit / CLI 行程內解析時不會把直譯器、快取等既有用量算進去
+    """
+
+    def __init__(self, limit_mb):
+        self.limit_mb = limit_mb
+        self.baseline_mb = current_rss_mb()
+        self.peak_mb = 0.0
+
+    def check(self):
+        used = current_rss_mb() - self.baseline_mb
+        self.peak_mb = max(self.peak_mb, used)
+        if self.limit_mb and used > self.limit_mb:
+            raise MemoryBudgetExceeded(f"解析時記憶體用量增加 {used:.0f} MB，超過上限 {self.limit_mb} MB")
+
+    def usage(self, error=None, cached=False, stages=None):
+        # stages：各解析階段耗時（見 metrics.capture_stages），由主行程以 record_parse 寫入統計
+        return {
+            "peak_mb": round(self.peak_mb, 1), "limit_mb": self.limit_mb, "error": error, "cached": cached,
+            "stages": stages or {},
+        }
+
+
+# ========== 上傳檔寫入暫存檔 ==========
+def spool_files(files, directory):
+    """
+    把上傳檔逐塊寫入 directory，不再整份複製成 bytes；回傳 [(檔名, 路徑)]
+    """
+    os.makedirs(directory, exist_ok=True)
+    documents = []
+    for i, file in enumerate(files):
+        ext = os.path.splitext(file.name)[1].lower()
+        path = os.path.join(directory, f"{i}{ext}")
+        file.seek(0)
+        with open(path, "wb") as out:
+            shutil.copyfileobj(file, out, SPOOL_CHUNK_BYTES)
+        documents.append((file.name, path))
+    return documents
+
+
+@contextmanager
+def spooled_uploads(files):
+    """
+    上傳檔寫入暫存目錄，產出 [(檔名, 暫存檔路徑)]；解析行程以路徑開檔，離開 with 區塊時刪除暫存檔
+    """
+    tmpdir = tempfile.mkdtemp(prefix="refcheck-")
+    try:
+        yield spool_files(files, tmpdir)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def parse_within_budget(filename, source, limit_mb):
+    """
+    在解析行程中執行：解析並回報記憶體峰值
+    超過上限時回傳錯誤訊息，而不是讓整個 server 被 OOM 終止
+    內容相同（SHA-256）且擷取規則未變動的檔案直接取用先前的解析結果（見 document_cache）
+    回傳：(parse_document 結果或 None, 記憶體用量)；解析結果的 digest 欄位為檔案內容的 SHA-256
+    """
+    budget = MemoryBudget(limit_mb)
+    file_ext = filename.split(".")[-1].lower()
+    digest = content_digest(source)
+    parsed = load_parsed(digest, file_ext)
+    if parsed is not None:
+        parsed["filename"] = filename
+        return parsed, budget.usage(cached=True)
+
+    try:
+        with capture_stages() as stages:
+            parsed = parse_document(filename, source, memory_check=budget.check)
+        budget.check()
+    except MemoryBudgetExceeded as e:
+        return None, budget.usage(error=str(e))
+    if parsed is not None:
+        parsed["digest"] = digest
+        save_parsed(digest, file_ext, parsed)
+    return parsed, budget.usage(stages=stages)
+
+
+def record_parse(filename, usage):
+    """
+    在主行程中呼叫：把解析行程回報的階段耗時與解析結果快取命中寫入效能統計
+    """
+    if usage["error"]:
+        return
+    count_cache("document_parse", usage["cached"])
+    record_file_stages(filename, usage["stages"])
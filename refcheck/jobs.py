@@ -0,0 +1,362 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+from . import metrics, providers
+from .ingest import spool_files
+from .lookup_cache import CACHE_DIR
+from .parallel import get_parse_pool, iter_parsed_documents
+from .pipeline import LookupDedupe, check_file, new_file_results, prefetch_lookups
+from .results import FileResults, Status
+from .serpapi_budget import get_budget
+
+
+# ========== 背景查詢設定 ==========
+# 「開始查詢」送出的工作存在 SQLite，由背景執行緒處理；關閉分頁、操作其他元件或斷線都不影響，
+# 重新整理後以網址上的工作編號（?job=...）繼續顯示進度與結果
+JOBS_PATH = os.path.join(CACHE_DIR, "jobs.sqlite3")
+
+# 上傳檔在工作完成前存放的目錄（每個工作一個子目錄）
+JOBS_DIR = os.path.join(CACHE_DIR, "jobs")
+
+# 同時執行的工作數（所有使用者共用）；其餘工作排隊
+JOB_WORKERS = int(os.environ.get("REFCHECK_JOB_WORKERS", 2))
+
+# 已完成的工作保留時間（秒），之後於送出新工作時清除
+JOB_RETENTION_SECONDS = 24 * 60 * 60
+
+# 查詢進度寫入 SQLite 的最短間隔（秒）
+PROGRESS_WRITE_SECONDS = 0.5
+
+# 沒有工作時，worker 檢查佇列的間隔（秒）
+IDLE_POLL_SECONDS = 2.0
+
+# 介面讀取工作進度的間隔（秒）
+JOB_POLL_SECONDS = 1.0
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+# ========== 工作儲存 ==========
+class JobStore:
+    """
+    工作的狀態、進度、各檔案的處理紀錄與查詢結果；同一台 server 的所有 session 共用
+    - files：各檔案的處理紀錄（解析方式、參考文獻段落、錯誤、Google Scholar 查詢紀錄等），介面據此顯示
+    - results：檔案結果（results.FileResults）列表，執行中為已完成的檔案
+    """
+
+    def __init__(self, path=JOBS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id          TEXT PRIMARY KEY,
+                status      TEXT NOT NULL,
+                created_at  REAL NOT NULL,
+                updated_at  REAL NOT NULL,
+                documents   TEXT NOT NULL,
+                progress    TEXT NOT NULL DEFAULT '{}',
+                files       TEXT NOT NULL DEFAULT '[]',
+                results     TEXT,
+                summary     TEXT,
+                error       TEXT
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)")
+        self._conn.commit()
+
+    def create(self, job_id, documents):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, created_at, updated_at, documents) VALUES (?, ?, ?, ?, ?)",
+                (job_id, QUEUED, now, now, json.dumps(documents, ensure_ascii=False)),
+            )
+            self._conn.commit()
+        return job_id
+
+    def claim(self):
+        """
+        取出最早排隊的工作並標記為執行中；沒有工作時回傳 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?", (RUNNING, time.time(), row[0])
+            )
+            self._conn.commit()
+        return self.get(row[0])
+
+    def update(self, job_id, **fields):
+        """
+        fields：status、progress、files、results、summary、error；dict / list 以 JSON 儲存
+        """
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        values = [
+            json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+            for value in fields.values()
+        ]
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {columns}, updated_at = ? WHERE id = ?", (*values, time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, created_at, documents, progress, files, results, summary, error "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, status, created_at, documents, progress, files, results, summary, error = row
+        progress = json.loads(progress)
+        if progress.get("live"):
+            progress["live"] = FileResults.from_dict(progress["live"])
+        return {
+            "id": job_id,
+            "status": status,
+            "created_at": created_at,
+            "documents": json.loads(documents),
+            "progress": progress,
+            "files": json.loads(files),
+            "results": [FileResults.from_dict(data) for data in json.loads(results)] if results else None,
+            "summary": json.loads(summary) if summary else None,
+            "error": error,
+        }
+
+    def position(self, job_id):
+        """
+        排隊中的工作前面還有幾個工作在排隊
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < "
+                "(SELECT created_at FROM jobs WHERE id = ?)",
+                (QUEUED, job_id),
+            ).fetchone()
+        return row[0]
+
+    def requeue_interrupted(self):
+        """
+        server 重新啟動時，上次執行到一半的工作重新排隊（上傳檔仍在 JOBS_DIR）
+        """
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = ?, progress = '{}', files = '[]', updated_at = ? WHERE status = ?",
+                (QUEUED, time.time(), RUNNING),
+            )
+            self._conn.commit()
+        return cur.rowcount
+
+    def purge(self, older_than=JOB_RETENTION_SECONDS):
+        cutoff = time.time() - older_than
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (DONE, FAILED, cutoff)
+            ).fetchall()
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", rows)
+            self._conn.commit()
+        for (job_id,) in rows:
+            shutil.rmtree(os.path.join(JOBS_DIR, job_id), ignore_errors=True)
+        return len(rows)
+
+
+# ========== 執行工作 ==========
+class JobProgress:
+    """
+    查詢進度：目前第幾個檔案、該檔案已查詢幾筆，以及查詢中的檔案結果（live，查詢時逐筆填入，見 pipeline.lookup_file）
+    介面據此即時顯示各分類；寫入 SQLite 的頻率以 PROGRESS_WRITE_SECONDS 限制，多筆結果合併為一次更新
+    """
+
+    def __init__(self, store, job_id, total_files):
+        self.store = store
+        self.job_id = job_id
+        self.state = {"files": total_files, "file": 0, "filename": "", "done": 0, "total": 0}
+        self.live = None
+        self._written = 0.0
+
+    def start_file(self, index, filename):
+        self.state.update(file=index, filename=filename, done=0, total=0)
+        self.live = None
+        self.write()
+
+    def watch(self, file_results):
+        self.live = file_results
+
+    def finish_file(self):
+        self.live = None
+        self.write()
+
+    def on_progress(self, done, total):
+        self.state.update(done=done, total=total)
+        if done == total or time.monotonic() - self._written >= PROGRESS_WRITE_SECONDS:
+            self.write()
+
+    def write(self):
+        self._written = time.monotonic()
+        live = self.live.to_dict() if self.live is not None else None
+        self.store.update(self.job_id, progress=dict(self.state, live=live))
+
+
+def run_job(store, job):
+    """
+    與原本在 Streamlit 中執行的流程相同：解析 → 逐檔查詢；各檔案的處理紀錄與結果寫入 store
+    """
+    job_id = job["id"]
+    documents = [tuple(document) for document in job["documents"]]
+    dedupe = LookupDedupe()
+    progress = JobProgress(store, job_id, len(documents))
+    files = []
+    all_results = []
+    # 統計為整個 server 行程累加，記下開始時的數值，結束後相減即為這次工作的部分（同時執行的工作會重疊計入）
+    metrics_before = metrics.snapshot()
+
+    # 所有檔案先送進解析行程池平行解析；全部解析完才查詢，所有檔案的 DOI 與標題一起批次預查
+    prepared = []  # (檔案結果或 None, digest)，與 files 順序相同；有 groups 的檔案才需要查詢
+    for index, (filename, parsed, memory) in enumerate(iter_parsed_documents(documents, get_parse_pool()), 1):
+        progress.start_file(index, filename)
+        entry = {
+            "filename": filename,
+            "error": memory["error"],
+            "parse_cached": memory["cached"],
+            "peak_mb": memory["peak_mb"],
+            "limit_mb": memory["limit_mb"],
+        }
+        files.append(entry)
+
+        if memory["error"]:
+            prepared.append((new_file_results(filename, [], parse_error=memory["error"]), None))
+        elif parsed is None:
+            entry["unsupported"] = True
+            prepared.append((None, None))
+        elif not parsed["matched_section"]:
+            entry["no_reference_section"] = True
+            prepared.append((new_file_results(filename, [], no_reference_section=True), None))
+        else:
+            entry.update(
+                matched_method=parsed["matched_method"],
+                matched_keyword=parsed["matched_keyword"],
+                matched_section=parsed["matched_section"],
+                groups=parsed["groups"],
+            )
+            prepared.append((new_file_results(filename, parsed["title_pairs"]), parsed.get("digest")))
+    store.update(job_id, files=files)
+
+    with metrics.stage("prefetch"):
+        prefetch_lookups([file_results for entry, (file_results, _) in zip(files, prepared) if "groups" in entry])
+
+    for index, (entry, (file_results, digest)) in enumerate(zip(files, prepared), 1):
+        progress.start_file(index, entry["filename"])
+        if "groups" in entry:
+            progress.watch(file_results)
+            # 內容相同的檔案先前已查核過時直接使用先前的結果
+            file_results, scholar_logs, from_cache = check_file(
+                file_results, digest, on_progress=progress.on_progress, dedupe=dedupe, prefetch=False,
+            )
+            entry.update(results_cached=from_cache, scholar_logs=scholar_logs)
+        if file_results is not None:
+            all_results.append(file_results)
+        # 已完成的檔案結果先寫入，介面不必等所有檔案查完
+        store.update(job_id, files=files, results=[r.to_dict() for r in all_results])
+        progress.finish_file()
+
+    credits_left = get_budget().remaining
+    summary = {
+        "references": dedupe.references,
+        "saved": dedupe.saved,
+        # 只看這次實際查詢的檔案；沿用文件快取的紀錄可能是先前工作的錯誤
+        "serpapi_error": providers.serpapi_error_from_logs(
+            [line for entry in files if not entry.get("results_cached") for line in entry.get("scholar_logs") or ()]
+        ),
+        "serpapi_exceeded": any(r.counts[Status.SERPAPI_EXCEEDED] for r in all_results),
+        "credits_left": credits_left,
+        "metrics": metrics.since(metrics_before) if metrics.METRICS_ENABLED else None,
+    }
+    store.update(job_id, status=DONE, results=[r.to_dict() for r in all_results], summary=summary)
+
+
+# ========== Worker ==========
+class JobRunner:
+    """
+    固定 JOB_WORKERS 個背景執行緒，依送出順序處理排隊中的工作
+    解析行程池與各查詢來源的速率限制在行程內共用，多個工作同時執行時不會超出上限
+    """
+
+    def __init__(self, store, workers=JOB_WORKERS):
+        self.store = store
+        self._wake = threading.Event()
+        self.store.requeue_interrupted()
+        self._threads = [
+            threading.Thread(target=self._loop, name=f"refcheck-job-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, uploaded_files):
+        """
+        上傳檔先寫入 JOBS_DIR（工作完成前 server 重新啟動也不會遺失），再排入佇列；回傳工作編號
+        """
+        self.store.purge()
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, spool_files(uploaded_files, os.path.join(JOBS_DIR, job_id)))
+        self._wake.set()
+        return job_id
+
+    def _loop(self):
+        while True:
+            job = self.store.claim()
+            if job is None:
+                self._wake.wait(IDLE_POLL_SECONDS)
+                self._wake.clear()
+                continue
+            try:
+                run_job(self.store, job)
+            except Exception as e:
+                traceback.print_exc()
+                self.store.update(job["id"], status=FAILED, error=f"{type(e).__name__}: {e}")
+            # 結果已寫入 store，上傳檔不再需要
+            shutil.rmtree(os.path.join(JOBS_DIR, job["id"]), ignore_errors=True)
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner():
+    """
+    每個 server 行程一份；第一次呼叫時啟動 worker
+    """
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner(JobStore())
+        return _runner
+
+
+def submit_job(uploaded_files):
+    return get_job_runner().submit(uploaded_files)
+
+
+def get_job(job_id):
+    return get_job_runner().store.get(job_id)
+
+
+def queue_position(job_id):
+    return get_job_runner().store.position(job_id)
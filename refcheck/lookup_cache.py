@@ -0,0 +1,176 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .metrics import count_cache
+
+
+# ========== 快取設定 ==========
+CACHE_DIR = os.environ.get(
+    "REFCHECK_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache"),
+)
+CACHE_PATH = os.path.join(CACHE_DIR, "lookup_cache.sqlite3")
+
+DAY = 24 * 60 * 60
+
+# 各查詢來源的快取有效時間（秒）
+PROVIDER_TTL = {
+    "crossref": 30 * DAY,      # DOI 對應的標題幾乎不會變
+    "scopus": 7 * DAY,
+    "scholar_title": 7 * DAY,
+    "scholar_ref": 7 * DAY,
+    "document_parse": 30 * DAY,   # 整份文件的解析結果（規則變動時 key 會改變）
+    "document_results": 7 * DAY,  # 整份文件的查核結果
+}
+DEFAULT_TTL = 7 * DAY
+
+# 查詢失敗（非 200、API 錯誤、例外）只短暫快取，避免短時間內重複打失敗的請求
+NEGATIVE_TTL = 15 * 60
+
+# 快取筆數上限，超過時依最後使用時間（LRU）淘汰
+MAX_ENTRIES = 200_000
+
+# 每寫入幾筆才檢查一次容量，避免每次都 COUNT(*)
+_EVICT_CHECK_EVERY = 500
+
+
+class LookupCache:
+    """
+    以 SQLite 儲存的查詢快取，key 為 (provider, 正規化後的查詢字串)
+    - 每個 provider 有自己的 TTL，失敗結果使用較短的 NEGATIVE_TTL
+    - 超過 max_entries 時依 last_used 淘汰最久未使用的資料
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES, ttl=None, negative_ttl=NEGATIVE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = dict(PROVIDER_TTL if ttl is None else ttl)
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS lookups (
+                provider   TEXT NOT NULL,
+                query_key  TEXT NOT NULL,
+                ok         INTEGER NOT NULL,
+                payload    TEXT,
+                expires_at REAL NOT NULL,
+                last_used  REAL NOT NULL,
+                PRIMARY KEY (provider, query_key)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_lookups_last_used ON lookups(last_used)")
+        self._conn.commit()
+
+    def get(self, provider, key):
+        """
+        回傳 (是否命中, 是否為成功結果, payload)
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT ok, payload, expires_at FROM lookups WHERE provider = ? AND query_key = ?",
+                (provider, key),
+            ).fetchone()
+            if row is None:
+                return False, False, None
+            ok, payload, expires_at = row
+            if expires_at < now:
+                self._conn.execute(
+                    "DELETE FROM lookups WHERE provider = ? AND query_key = ?", (provider, key)
+                )
+                self._conn.commit()
+                return False, False, None
+            self._conn.execute(
+                "UPDATE lookups SET last_used = ? WHERE provider = ? AND query_key = ?",
+                (now, provider, key),
+            )
+            self._conn.commit()
+        return True, bool(ok), json.loads(payload) if payload is not None else None
+
+    def set(self, provider, key, payload, ok=True):
+        now = time.time()
+        ttl = self.ttl.get(provider, DEFAULT_TTL) if ok else self.negative_ttl
+        data = json.dumps(payload, ensure_ascii=False) if payload is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO lookups (provider, query_key, ok, payload, expires_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (provider, key, int(bool(ok)), data, now + ttl, now),
+            )
+            self._writes += 1
+            if self._writes % _EVICT_CHECK_EVERY == 0:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # 先清過期資料，仍超過上限才依 LRU 淘汰
+        self._conn.execute("DELETE FROM lookups WHERE expires_at < ?", (time.time(),))
+        count = self._conn.execute("SELECT COUNT(*) FROM lookups").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM lookups WHERE rowid IN "
+                "(SELECT rowid FROM lookups ORDER BY last_used ASC LIMIT ?)",
+                (overflow,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM lookups")
+            self._conn.commit()
+
+
+# ========== 共用快取（每個 server 行程一份） ==========
+_default_cache = None
+_default_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_cache():
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = LookupCache()
+        return _default_cache
+
+
+def fetch_count():
+    """
+    目前執行緒呼叫 fetch（實際送出查詢）的次數；前後相減可判斷一段查詢是否只用到快取
+    """
+    return getattr(_local, "fetches", 0)
+
+
+def _fetch(fetch):
+    result = fetch()
+    _local.fetches = fetch_count() + 1
+    return result
+
+
+def cached_lookup(provider, key, fetch):
+    """
+    先查快取，命中就直接回傳，不呼叫 fetch
+    fetch() 需回傳 (ok, payload)；payload 必須可轉成 JSON
+    """
+    if not key:
+        return _fetch(fetch)
+
+    cache = get_cache()
+    hit, ok, payload = cache.get(provider, key)
+    count_cache(provider, hit)
+    if hit:
+        return ok, payload
+
+    ok, payload = _fetch(fetch)
+    cache.set(provider, key, payload, ok=ok)
+    return ok, payload
@@ -0,0 +1,355 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# ========== 效能統計設定 ==========
+# 記錄各階段耗時、各查詢來源的請求數 / 延遲 / 錯誤 / 重試，以及查詢快取命中率
+# 設定 REFCHECK_METRICS=0 停用；停用時各 hook 只做一次布林判斷
+METRICS_ENABLED = os.environ.get("REFCHECK_METRICS", "1") != "0"
+
+# 無介面執行時以 Prometheus 文字格式提供 /metrics（0 為不啟動）
+METRICS_PORT = int(os.environ.get("REFCHECK_METRICS_PORT", "0") or 0)
+
+# /metrics 沒有驗證且含各檔案名稱，預設只接受本機連線；要讓其他主機抓取時再改為 0.0.0.0
+METRICS_HOST = os.environ.get("REFCHECK_METRICS_HOST", "127.0.0.1")
+
+# 各檔案的階段耗時只保留最近這麼多個檔案，長時間執行的 server 不會無限累積
+METRICS_MAX_FILES = int(os.environ.get("REFCHECK_METRICS_MAX_FILES", 200))
+
+# 延遲直方圖各區間的上界（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# 匯出與介面顯示用的階段名稱
+STAGE_LABELS = {
+    "extract": "段落擷取",
+    "section": "參考文獻區段",
+    "merge": "合併",
+    "split": "切分",
+    "titles": "標題擷取",
+    "prefetch": "批次預查",
+    "lookup": "逐筆查詢",
+}
+
+METRICS_COLUMNS = ["類別", "項目", "次數", "秒數", "說明"]
+
+
+def set_enabled(enabled):
+    global METRICS_ENABLED
+    METRICS_ENABLED = bool(enabled)
+
+
+def is_error_status(status):
+    # Crossref 查無 DOI 回 404 屬正常結果，不算錯誤
+    return status is None or (status >= 400 and status != 404)
+
+
+# ========== 統計資料 ==========
+class MetricsRegistry:
+    """
+    所有數值皆為累加值，snapshot() 前後相減（見 since）即為某次執行的統計
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}     # 階段 → {"count", "seconds"}
+            self.files = OrderedDict()  # 檔名 → {階段: 秒數}，最近更新的在最後
+            self.providers = {}  # 查詢來源 → 請求數、錯誤、重試、延遲直方圖
+            self.caches = {}     # 快取類別 → {"hits", "misses"}
+
+    def add_stage(self, name, filename, seconds):
+        with self._lock:
+            entry = self.stages.setdefault(name, {"count": 0, "seconds": 0.0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            if filename:
+                per_file = self.files.setdefault(filename, {})
+                per_file[name] = per_file.get(name, 0.0) + seconds
+                self.files.move_to_end(filename)
+                while len(self.files) > METRICS_MAX_FILES:
+                    self.files.popitem(last=False)
+
+    def _provider(self, provider):
+        entry = self.providers.get(provider)
+        if entry is None:
+            entry = self.providers[provider] = {
+                "calls": 0, "errors": 0, "retries": 0, "seconds": 0.0,
+                "statuses": {}, "buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+            }
+        return entry
+
+    def observe_call(self, provider, seconds, status):
+        """
+        status 為 HTTP 狀態碼；連線錯誤或逾時為 None
+        """
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+        label = str(status) if status is not None else "exception"
+        with self._lock:
+            entry = self._provider(provider)
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["buckets"][bucket] += 1
+            entry["statuses"][label] = entry["statuses"].get(label, 0) + 1
+            if is_error_status(status):
+                entry["errors"] += 1
+
+    def count_retry(self, provider):
+        with self._lock:
+            self._provider(provider)["retries"] += 1
+
+    def count_cache(self, name, hit):
+        with self._lock:
+            entry = self.caches.setdefault(name, {"hits": 0, "misses": 0})
+            entry["hits" if hit else "misses"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "stages": {k: dict(v) for k, v in self.stages.items()},
+                "files": {k: dict(v) for k, v in self.files.items()},
+                "providers": {
+                    k: dict(v, statuses=dict(v["statuses"]), buckets=list(v["buckets"]))
+                    for k, v in self.providers.items()
+                },
+                "caches": {k: dict(v) for k, v in self.caches.items()},
+            }
+
+
+REGISTRY = MetricsRegistry()
+
+
+# ========== Hooks ==========
+_NULL_STAGE = nullcontext()
+_local = threading.local()
+
+
+class _StageTimer:
+    __slots__ = ("name", "filename", "start")
+
+    def __init__(self, name, filename):
+        self.name = name
+        self.filename = filename
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        captured = getattr(_local, "stages", None)
+        if captured is not None:
+            captured[self.name] = captured.get(self.name, 0.0) + seconds
+        else:
+            REGISTRY.add_stage(self.name, self.filename, seconds)
+        return False
+
+
+def stage(name, filename=None):
+    """
+    用法：with stage("extract", filename): ...
+    同一檔案同一階段多次進入時累加
+    """
+    if not METRICS_ENABLED:
+        return _NULL_STAGE
+    return _StageTimer(name, filename)
+
+
+@contextmanager
+def capture_stages():
+    """
+    解析在其他行程中進行，統計無法直接寫回主行程：期間的階段耗時改收集到回傳的 dict，
+    隨解析結果送回主行程後再以 record_file_stages 寫入
+    """
+    previous = getattr(_local, "stages", None)
+    stages = _local.stages = {}
+    try:
+        yield stages
+    finally:
+        _local.stages = previous
+
+
+def record_file_stages(filename, stages):
+    if METRICS_ENABLED:
+        for name, seconds in (stages or {}).items():
+            REGISTRY.add_stage(name, filename, seconds)
+
+
+def observe_call(provider, seconds, status):
+    if METRICS_ENABLED:
+        REGISTRY.observe_call(provider, seconds, status)
+
+
+def count_retry(provider):
+    if METRICS_ENABLED:
+        REGISTRY.count_retry(provider)
+
+
+def count_cache(name, hit):
+    if METRICS_ENABLED:
+        REGISTRY.count_cache(name, hit)
+
+
+# ========== 讀取與匯出 ==========
+def snapshot():
+    return REGISTRY.snapshot()
+
+
+def _subtract(after, before):
+    if isinstance(after, dict):
+        before = before or {}
+        return {k: _subtract(v, before.get(k)) for k, v in after.items()}
+    if isinstance(after, list):
+        before = before or [0] * len(after)
+        return [a - b for a, b in zip(after, before)]
+    return after - (before or 0)
+
+
+def since(before):
+    """
+    目前的統計減去先前的 snapshot：同一個 server 行程中多次執行時，只取這次執行的部分
+    """
+    return _subtract(snapshot(), before)
+
+
+def histogram_quantile(buckets, q):
+    """
+    以直方圖估計分位數，回傳該分位數所在區間的上界（秒）；落在最後一個區間時回傳 None
+    """
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    running = 0
+    for bound, count in zip(LATENCY_BUCKETS, buckets):
+        running += count
+        if running >= q * total:
+            return bound
+    return None
+
+
+def export_rows(data):
+    """
+    統計 → [類別, 項目, 次數, 秒數, 說明]，供 CSV 匯出與介面表格使用；沒有發生的項目略過
+    """
+    rows = []
+    for name, entry in data["stages"].items():
+        if entry["count"]:
+            rows.append(["階段", STAGE_LABELS.get(name, name), entry["count"], round(entry["seconds"], 3), ""])
+    for filename, per_stage in data["files"].items():
+        total = sum(per_stage.values())
+        if total > 0:
+            detail = "、".join(
+                f"{STAGE_LABELS.get(name, name)} {seconds:.2f}s" for name, seconds in per_stage.items() if seconds > 0
+            )
+            rows.append(["檔案", filename, "", round(total, 3), detail])
+    for provider, entry in data["providers"].items():
+        if entry["calls"]:
+            p95 = histogram_quantile(entry["buckets"], 0.95)
+            detail = (
+                f"平均 {1000 * entry['seconds'] / entry['calls']:.0f} ms、"
+                f"p95 ≤ {f'{p95:g}s' if p95 is not None else f'>{LATENCY_BUCKETS[-1]}s'}、"
+                f"錯誤 {entry['errors']}、重試 {entry['retries']}"
+            )
+            rows.append(["查詢來源", provider, entry["calls"], round(entry["seconds"], 3), detail])
+    for name, entry in data["caches"].items():
+        lookups = entry["hits"] + entry["misses"]
+        if lookups:
+            rows.append(["快取", name, lookups, "", f"命中率 {entry['hits'] / lookups:.0%}"])
+    return rows
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def prometheus_text(data=None):
+    """
+    Prometheus 文字格式（累加值）；各檔案的耗時不輸出，避免 label 數量無限增加
+    """
+    data = data or snapshot()
+    lines = [
+        "# HELP refcheck_stage_seconds_total Wall time spent in each parsing / lookup stage.",
+        "# TYPE refcheck_stage_seconds_total counter",
+    ]
+    lines += [f"refcheck_stage_seconds_total{_labels(stage=k)} {v['seconds']:.6f}" for k, v in data["stages"].items()]
+    lines += ["# TYPE refcheck_stage_runs_total counter"]
+    lines += [f"refcheck_stage_runs_total{_labels(stage=k)} {v['count']}" for k, v in data["stages"].items()]
+
+    lines += [
+        "# HELP refcheck_provider_requests_total HTTP requests sent to each provider, by status.",
+        "# TYPE refcheck_provider_requests_total counter",
+    ]
+    for provider, entry in data["providers"].items():
+        lines += [
+            f"refcheck_provider_requests_total{_labels(provider=provider, status=status)} {count}"
+            for status, count in entry["statuses"].items()
+        ]
+    lines += ["# TYPE refcheck_provider_retries_total counter"]
+    lines += [
+        f"refcheck_provider_retries_total{_labels(provider=p)} {e['retries']}" for p, e in data["providers"].items()
+    ]
+
+    lines += [
+        "# HELP refcheck_provider_latency_seconds Provider request latency.",
+        "# TYPE refcheck_provider_latency_seconds histogram",
+    ]
+    for provider, entry in data["providers"].items():
+        running = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), entry["buckets"]):
+            running += count
+            lines.append(f"refcheck_provider_latency_seconds_bucket{_labels(provider=provider, le=bound)} {running}")
+        lines.append(f"refcheck_provider_latency_seconds_sum{_labels(provider=provider)} {entry['seconds']:.6f}")
+        lines.append(f"refcheck_provider_latency_seconds_count{_labels(provider=provider)} {entry['calls']}")
+
+    lines += [
+        "# HELP refcheck_cache_lookups_total Lookup cache reads, by result.",
+        "# TYPE refcheck_cache_lookups_total counter",
+    ]
+    for name, entry in data["caches"].items():
+        lines.append(f"refcheck_cache_lookups_total{_labels(cache=name, result='hit')} {entry['hits']}")
+        lines.append(f"refcheck_cache_lookups_total{_labels(cache=name, result='miss')} {entry['misses']}")
+    return "\n".join(lines) + "\n"
+
+
+# ========== Prometheus 端點 ==========
+_server = None
+_server_lock = threading.Lock()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_prometheus(port=None, host=None):
+    """
+    在背景執行緒提供 /metrics；同一行程只啟動一次。port / host 未指定時使用 REFCHECK_METRICS_PORT / REFCHECK_METRICS_HOST
+    回傳 server，沒有設定 port 時回傳 None
+    """
+    global _server
+    port = port or METRICS_PORT
+    host = host or METRICS_HOST
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server
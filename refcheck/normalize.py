@@ -0,0 +1,74 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+
+# ========== 標題正規化 ==========
+# 以 str.translate 取代逐字元的 Python 迴圈；結果與原本的逐字元寫法完全相同
+
+# dash 類符號（刪除）
+DASH_VARIANTS = ["-", "–", "—", "−", "‑", "‐"]
+
+STANDALONE_NUMBER_RE = re.compile(r'\b\d+\b')
+
+# 同一標題在比對過程中會被清洗很多次，結果直接記住
+NORMALIZE_CACHE_SIZE = 65536
+
+
+class _TranslateTable(dict):
+    """
+    str.translate 用的對照表：第一次遇到的字元才計算並存入表中
+    不在表中的字元也存入（對應到自己），避免 translate 每次查不到都拋出 LookupError
+    """
+
+    def __init__(self, map_char):
+        super().__init__()
+        self.map_char = map_char
+
+    def __missing__(self, codepoint):
+        value = self.map_char(chr(codepoint))
+        self[codepoint] = value
+        return value
+
+
+def _drop_dash(ch):
+    return None if ch in DASH_VARIANTS else ch
+
+
+def _keep_text(ch):
+    # 字母、數字、空白（L / N / Z 類別）轉小寫，其餘（標點、符號）刪除
+    return ch.lower() if unicodedata.category(ch)[0] in ("L", "N", "Z") else None
+
+
+DASH_TABLE = _TranslateTable(_drop_dash)
+KEEP_TEXT_TABLE = _TranslateTable(_keep_text)
+
+
+def _collapse_whitespace(text):
+    # 同 re.sub(r'\s+', ' ', text).strip()：str.split() 與 \s 使用相同的空白定義
+    return ' '.join(text.split())
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def clean_title(text):
+    # 移除 dash 類符號 → 標準化字符（例如全形轉半形）→ 過濾標點與符號（不刪文字！）→ 統一空白
+    text = unicodedata.normalize('NFKC', text.translate(DASH_TABLE))
+    return _collapse_whitespace(text.translate(KEEP_TEXT_TABLE))
+
+
+# 專門給補救命中的清洗
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def clean_title_for_remedial(text):
+    """給補救查詢用的清洗：去掉單獨數字、標點、全形轉半形等"""
+    # 全形轉半形 → 移除 dash 類符號 → 移除單獨的數字詞（如頁碼、卷號）→ 保留字母、數字、空白
+    text = unicodedata.normalize('NFKC', text).translate(DASH_TABLE)
+    text = STANDALONE_NUMBER_RE.sub('', text)
+    return _collapse_whitespace(text.translate(KEEP_TEXT_TABLE))
+
+
+def clean_titles(texts):
+    return [clean_title(text) for text in texts]
+
+
+def clean_titles_for_remedial(texts):
+    return [clean_title_for_remedial(text) for text in texts]
@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from .ingest import MEMORY_BUDGET_MB, parse_within_budget, record_parse
+
+
+# ========== 平行解析設定 ==========
+# 解析用的行程數；設為 0 則在目前行程內直接解析
+PARSE_WORKERS = int(os.environ.get("REFCHECK_PARSE_WORKERS", min(4, os.cpu_count() or 1)))
+
+
+# ========== 行程池（每個 server 行程一份） ==========
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_parse_pool():
+    """
+    Streamlit server 是多執行緒行程，fork 容易卡死，因此使用 spawn
+    """
+    global _pool
+    if PARSE_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+class _Done:
+    """
+    在目前行程內同步完成的工作，介面與 Future.result() 相同
+    """
+
+    def __init__(self, value):
+        self._value = value
+
+    def result(self):
+        return self._value
+
+
+def worker_memory_limit_mb(workers=PARSE_WORKERS):
+    # 每個解析行程分到的記憶體上限
+    return MEMORY_BUDGET_MB // max(1, workers)
+
+
+def submit_parse(pool, filename, source, workers=PARSE_WORKERS):
+    """
+    source 為路徑（建議，見 ingest.spooled_uploads）或 bytes，必須可送進其他行程
+    workers：pool 的行程數（自行建立的行程池需傳入），用來分配每個行程的記憶體上限
+    回傳具有 result() 的物件，結果同 ingest.parse_within_budget
+    """
+    if pool is None:
+        # 在目前行程內解析時，整個行程適用全部的記憶體上限
+        return _Done(parse_within_budget(filename, source, MEMORY_BUDGET_MB))
+    # PDF 由後往前讀、找到參考文獻標題即停止（見 parse_pdf_tail_first），整份檔案交給同一個行程
+    return pool.submit(parse_within_budget, filename, source, worker_memory_limit_mb(workers))
+
+
+def iter_parsed_documents(documents, pool=None):
+    """
+    documents：[(檔名, 路徑或 bytes)]
+    全部先送進行程池，再依輸入順序逐一產出 (檔名, parse_document 結果, 記憶體用量)；
+    呼叫端處理第 1 個檔案的網路查詢時，後面的檔案仍在其他行程中解析
+    超過記憶體上限的檔案，結果為 None 且記憶體用量中的 error 有說明
+    """
+    pending = [(filename, submit_parse(pool, filename, source)) for filename, source in documents]
+    for filename, job in pending:
+        parsed, usage = job.result()
+        record_parse(filename, usage)
+        yield filename, parsed, usage
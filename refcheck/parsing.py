@@ -0,0 +1,512 @@
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+from io import BytesIO
+
+from .metrics import stage
+from .rules import (
+    IEEE_HEAD_RE,
+    detect_reference_style,
+    is_appendix_heading,
+    scan_reference,
+)
+
+
+# ========== Word 處理 ==========
+# 直接從 zip 串流讀取 word/document.xml，不建立 python-docx 的整份物件樹
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+W_BODY = W_NS + "body"
+W_P = W_NS + "p"
+W_R = W_NS + "r"
+W_HYPERLINK = W_NS + "hyperlink"
+W_PPR = W_NS + "pPr"
+W_PSTYLE = W_NS + "pStyle"
+W_OUTLINE_LVL = W_NS + "outlineLvl"
+W_VAL = W_NS + "val"
+W_TYPE = W_NS + "type"
+W_T = W_NS + "t"
+W_BR = W_NS + "br"
+
+# run 內各元素對應的文字（同 python-docx 的 Run.text）
+W_RUN_TEXT = {
+    W_NS + "tab": "\t",
+    W_NS + "ptab": "\t",
+    W_NS + "cr": "\n",
+    W_NS + "noBreakHyphen": "-",
+}
+
+# 標題樣式名稱（Word 內建樣式在 XML 中一律為英文名稱，例如 heading 1）
+HEADING_STYLE_PREFIXES = ("heading", "title", "標題")
+REFERENCE_HEADING_HINT_RE = re.compile(r'參考|文獻|reference|bibliography|works cited|literature cited', re.IGNORECASE)
+
+# 每讀幾個段落檢查一次記憶體
+DOCX_MEMORY_CHECK_EVERY = 2000
+
+def open_docx_zip(file):
+    # file 可為路徑、bytes 或 file-like 物件
+    if isinstance(file, (bytes, bytearray)):
+        file = BytesIO(file)
+    return zipfile.ZipFile(file)
+
+def read_docx_style_names(zf):
+    """
+    styles.xml：styleId → 樣式名稱
+    """
+    try:
+        xml = zf.read("word/styles.xml")
+    except KeyError:
+        return {}
+    names = {}
+    for style in ET.fromstring(xml).iter(W_NS + "style"):
+        name = style.find(W_NS + "name")
+        if name is not None:
+            names[style.get(W_NS + "styleId")] = name.get(W_VAL)
+    return names
+
+def run_text(run):
+    parts = []
+    for child in run:
+        if child.tag == W_T:
+            parts.append(child.text or "")
+        elif child.tag == W_BR:
+            # 只有一般換行算 "\n"，分頁、分欄為空字串
+            if child.get(W_TYPE, "textWrapping") == "textWrapping":
+                parts.append("\n")
+        else:
+            parts.append(W_RUN_TEXT.get(child.tag, ""))
+    return "".join(parts)
+
+def docx_paragraph_text(p):
+    # 同 python-docx 的 Paragraph.text：直屬的 run 與超連結內的 run
+    parts = []
+    for child in p:
+        if child.tag == W_R:
+            parts.append(run_text(child))
+        elif child.tag == W_HYPERLINK:
+            parts.extend(run_text(r) for r in child if r.tag == W_R)
+    return "".join(parts)
+
+def docx_paragraph_style(p, style_names):
+    """
+    回傳段落的樣式名稱；沒有指定樣式但有大綱階層時視為標題
+    """
+    ppr = p.find(W_PPR)
+    if ppr is None:
+        return None
+    pstyle = ppr.find(W_PSTYLE)
+    if pstyle is not None:
+        style_id = pstyle.get(W_VAL)
+        return style_names.get(style_id, style_id)
+    if ppr.find(W_OUTLINE_LVL) is not None:
+        return "heading"
+    return None
+
+def iter_docx_paragraphs(file):
+    """
+    逐段產出 (段落文字, 樣式名稱或 None)
+    只取 body 直屬段落（不含表格內），與 python-docx 的 doc.paragraphs 相同；
+    每個段落處理完即丟棄其 XML 節點，記憶體只與單一段落大小有關
+    """
+    with open_docx_zip(file) as zf:
+        style_names = read_docx_style_names(zf)
+        with zf.open("word/document.xml") as xml:
+            depth = 0
+            body = None
+            for event, elem in ET.iterparse(xml, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if depth == 2 and elem.tag == W_BODY:
+                        body = elem
+                    continue
+                depth -= 1
+                if depth == 2 and body is not None:
+                    # body 直屬元素（段落、表格等）結束
+                    if elem.tag == W_P:
+                        yield docx_paragraph_text(elem), docx_paragraph_style(elem, style_names)
+                    body.clear()
+
+def is_heading_style(style_name):
+    return bool(style_name) and style_name.lower().startswith(HEADING_STYLE_PREFIXES)
+
+def extract_paragraphs_from_docx(file):
+    # file 可為 UploadedFile、路徑或 bytes
+    return [text.strip() for text, _ in iter_docx_paragraphs(file) if text.strip()]
+
+def parse_docx_streaming(filename, file, memory_check=None):
+    """
+    逐段讀取 DOCX，並記下最後一個像參考文獻標題的標題樣式段落
+    - 先只在該段落到文件結尾之間由下往上找標題；由下往上先找到的就是最後一個符合的段落，
+      因此在這個範圍找到即與整份掃描的結果相同
+    - 沒有這類標題段落、或範圍內找不到時，改用 parse_paragraphs 的完整流程
+    memory_check：每讀完一批段落呼叫一次（見 ingest.MemoryBudget）
+    """
+    paragraphs = []
+    reference_heading = None
+    with stage("extract", filename):
+        for text, style in iter_docx_paragraphs(file):
+            text = text.strip()
+            if not text:
+                continue
+            if is_heading_style(style) and REFERENCE_HEADING_HINT_RE.search(text):
+                reference_heading = len(paragraphs)
+            paragraphs.append(text)
+            if memory_check and len(paragraphs) % DOCX_MEMORY_CHECK_EVERY == 0:
+                memory_check()
+
+    if reference_heading is not None:
+        with stage("section", filename):
+            matched_section, matched_keyword, matched_method = extract_reference_section_improved(
+                paragraphs, search_start=reference_heading
+            )
+        if matched_section:
+            return build_parsed(filename, "docx", matched_section, matched_keyword, matched_method)
+    return parse_paragraphs(filename, "docx", paragraphs)
+
+# ========== PDF 處理 ==========
+def open_pdf(file):
+    # file 可為路徑、bytes 或 file-like 物件
+    # PyMuPDF 載入較慢，第一次處理 PDF 時才匯入（只上傳 Word 檔時不需要）
+    import fitz
+
+    if isinstance(file, str):
+        return fitz.open(file)
+    if isinstance(file, (bytes, bytearray)):
+        return fitz.open(stream=file, filetype="pdf")
+    return fitz.open(stream=file.read(), filetype="pdf")
+
+def extract_paragraphs_from_pdf(file, start=0, stop=None):
+    """
+    擷取 [start, stop) 頁的段落；各頁範圍的結果依序串接即等於整份文件的結果
+    """
+    with open_pdf(file) as doc:
+        return [p for i in range(start, min(stop or len(doc), len(doc))) for p in page_paragraphs(doc[i])]
+
+def page_paragraphs(page):
+    return [p.strip() for p in page.get_text("text").split("\n") if p.strip()]
+
+# ========== PDF 由後往前讀取 ==========
+# 每次往前多讀的頁數
+PDF_TAIL_CHUNK_PAGES = 8
+
+def parse_pdf_tail_first(filename, file, memory_check=None):
+    """
+    參考文獻通常在最後幾頁：由最後一頁往前分批擷取，每批只檢查新讀入的段落是否為參考文獻標題
+    標題以下的段落（含附錄邊界）都已讀入，因此找到標題即可停止
+    - 從底部往上找的結果只取決於該段落與其後的段落，與整份掃描的結果相同
+    - 找不到標題（或標題下沒有內容）時才讀完整份，改用 parse_paragraphs 的完整流程
+    memory_check：每讀完一批頁面呼叫一次（見 ingest.MemoryBudget）
+    """
+    with open_pdf(file) as doc:
+        paragraphs = []
+        stop = len(doc)
+        while stop > 0:
+            start = max(0, stop - PDF_TAIL_CHUNK_PAGES)
+            with stage("extract", filename):
+                new_paragraphs = [p for i in range(start, stop) for p in page_paragraphs(doc[i])]
+            paragraphs = new_paragraphs + paragraphs
+            stop = start
+            if memory_check:
+                memory_check()
+
+            with stage("section", filename):
+                matched_section, matched_keyword, matched_method = extract_reference_section_improved(
+                    paragraphs, search_end=len(new_paragraphs)
+                )
+            if matched_keyword is not None:
+                if matched_section:
+                    return build_parsed(filename, "pdf", matched_section, matched_keyword, matched_method)
+                break
+
+        # 需要整份段落：補讀剩下的頁數
+        head = []
+        with stage("extract", filename):
+            for i in range(stop):
+                head.extend(page_paragraphs(doc[i]))
+                if memory_check and i % PDF_TAIL_CHUNK_PAGES == 0:
+                    memory_check()
+    return parse_paragraphs(filename, "pdf", head + paragraphs)
+
+# ========== 萃取參考文獻 ==========
+def extract_reference_section_from_bottom(paragraphs, start_keywords=None):
+    """
+    從底部往上找出參考文獻區段起點，並向下擷取至遇到停止標題（如附錄）為止
+    回傳格式：matched_section, matched_keyword
+    """
+    if start_keywords is None:
+        start_keywords = [
+            "參考文獻", "參考資料", "references", "reference",
+            "bibliography", "works cited", "literature cited",
+            "references and citations"
+        ]
+
+    for i in reversed(range(len(paragraphs))):
+        para = paragraphs[i].strip()
+
+        # 跳過太長或包含標點的段落（可能是正文）
+        if len(para) > 30 or re.search(r'[.,;:]', para):
+            continue
+
+        normalized = para.lower()
+        if normalized in start_keywords:
+            # 從 i+1 開始擷取，直到遇到附錄為止
+            result = []
+            for p in paragraphs[i + 1:]:
+                if is_appendix_heading(p):
+                    break
+                result.append(p)
+            return result, para
+
+    return [], None
+
+
+
+# ========== 萃取參考文獻 (加強版) ==========
+#也是需要把附錄截掉
+def clip_until_stop(paragraphs_after):
+    result = []
+    for para in paragraphs_after:
+        if is_appendix_heading(para):
+            break
+        result.append(para)
+    return result
+
+def extract_reference_section_improved(paragraphs, search_end=None, search_start=0):
+    """
+    改進的參考文獻區段識別，從底部往上掃描，使用多重策略和容錯機制
+    search_end：只在 paragraphs[:search_end] 中找標題（後面的段落已檢查過，仍可作為內容）
+    search_start：只往上找到 paragraphs[search_start] 為止
+    返回：(參考文獻段落列表, 識別到的標題, 識別方法)
+    """
+
+    def is_reference_format(text):
+        text = text.strip()
+        if len(text) < 10:
+            return False
+        if re.search(r'\(\d{4}[a-c]?\)', text):  # APA 年份格式
+            return True
+        if re.match(r'^\[\d+\]', text):         # IEEE 編號格式
+            return True
+        if re.search(r'[A-Z][a-z]+,\s*[A-Z]\.', text):  # 作者名樣式
+            return True
+        return False
+
+    reference_keywords = [
+        "參考文獻", "references", "reference",
+        "bibliography", "works cited", "literature cited",
+        "references and citations", "參考文獻格式"
+    ]
+
+    # ✅ 從底部往上掃描
+    for i in reversed(range(search_start, len(paragraphs) if search_end is None else search_end)):
+        para = paragraphs[i].strip()
+        para_lower = para.lower()
+        para_nospace = re.sub(r'\s+', '', para_lower)
+
+        # ✅ 純標題相符（e.g. "References"）
+        if para_lower in reference_keywords:
+            return clip_until_stop(paragraphs[i + 1:]), para, "純標題識別（底部）"
+
+        # ✅ 容錯標題（含章節編號）
+        # 支援中文大寫數字章節（如：陸、柒、參、捌）
+        if re.match(
+            r'^((第?[一二三四五六七八九十百千萬壹貳參肆伍陸柒捌玖拾佰仟萬]+章[、．.︑,，]?)|(\d+|[IVXLCDM]+|[一二三四五六七八九十壹貳參肆伍陸柒捌玖拾]+)?[、．.︑,， ]?)?\s*(參考文獻|參考資料|references?|bibliography|works cited|literature cited|references and citations)\s*$',
+            para_lower
+        ):
+            return clip_until_stop(paragraphs[i + 1:]), para.strip(), "章節標題識別（底部）"
+
+
+        # ✅ 模糊關鍵字 + 後面段落像 APA 格式
+        fuzzy_keywords = ["reference", "參考", "bibliography", "文獻", " REFERENCES AND CITATIONS"]
+        if any(para_lower.strip() == k for k in fuzzy_keywords):  # ❗ 只接受整行剛好等於關鍵字
+            if i + 1 < len(paragraphs):
+                next_paras = paragraphs[i+1:i+6]
+                if sum(1 for p in next_paras if is_reference_format(p)) >= 1:
+                    return clip_until_stop(paragraphs[i + 1:]), para.strip(), "模糊標題+內容識別"
+
+
+
+    return [], None, "未找到參考文獻區段"
+
+
+# ========== 段落合併器（PDF 專用，根據參考文獻開頭切分） ==========
+def detect_and_split_ieee(paragraphs):
+    """
+    若第一段為 IEEE 格式 [1] 開頭，則將整段合併並依據 [數字] 切割
+    """
+    if not paragraphs:
+        return None
+
+    first_line = paragraphs[0].strip()
+    if not IEEE_HEAD_RE.match(first_line):
+        return None
+
+    full_text = ' '.join(paragraphs)  # 將換行視為空格
+    refs = re.split(r'(?=\[\d+\])', full_text)  # 用 lookahead 保留切割點
+    return [r.strip() for r in refs if r.strip()]
+
+def merge_references_by_heads(paragraphs):
+    merged = []
+
+    for para in paragraphs:
+        scan = scan_reference(para)
+
+        # APA 判斷只看第一個年份；APA_LIKE 回傳多個年份位置
+        apa_count = 1 if scan.apa else 0
+        apalike_count = len(scan.apalike_matches)
+
+        if apa_count >= 2 or apalike_count >= 2:
+            sub_refs = split_multiple_apa_in_paragraph(para)
+            merged.extend([s.strip() for s in sub_refs if s.strip()])
+        else:
+            if scan.is_head:
+                merged.append(para.strip())
+            else:
+                if merged:
+                    merged[-1] += " " + para.strip()
+                else:
+                    merged.append(para.strip())
+
+    return merged
+
+
+def split_multiple_apa_in_paragraph(paragraph):
+    """
+    改良版：從出現第 2 筆 APA 或 APA_LIKE 年份起，每筆往前固定 5 字元切段。
+    - APA： (2020)、(2020a)、(n.d.)
+    - APA_LIKE： , 2020. 或 .2020. 等，且前 5 字元不能含數字
+    """
+
+    # 使用單次掃描結果中所有 APA 與 APA_LIKE 的 matches
+    all_matches = sorted(scan_reference(paragraph).year_matches, key=lambda m: m.start())
+
+    # 若不到 2 筆則不切
+    if len(all_matches) < 2:
+        return [paragraph]
+
+    # 每筆從前面固定回推 5 字元切割
+    split_indices = []
+    for match in all_matches[1:]:  # 從第 2 筆開始切
+        cut_index = max(0, match.start() - 5)
+        split_indices.append(cut_index)
+
+    segments = []
+    start = 0
+    for idx in split_indices:
+        segments.append(paragraph[start:idx].strip())
+        start = idx
+    segments.append(paragraph[start:].strip())
+
+    return [s for s in segments if s]
+
+
+# ========== 單一檔案解析流程 ==========
+SUPPORTED_EXTENSIONS = ("docx", "pdf")
+
+def extract_paragraphs(file, file_ext):
+    if file_ext == "docx":
+        return extract_paragraphs_from_docx(file)
+    if file_ext == "pdf":
+        return extract_paragraphs_from_pdf(file)
+    return None
+
+def extract_reference_section(paragraphs):
+    """
+    先跑加強版，找不到再 fallback
+    回傳：(參考文獻段落列表, 識別到的標題, 識別方法)
+    """
+    matched_section, matched_keyword, matched_method = extract_reference_section_improved(paragraphs)
+
+    if not matched_section:
+        matched_section, matched_keyword = extract_reference_section_from_bottom(paragraphs)
+        matched_method = "標準標題識別（底部）"
+
+    return matched_section, matched_keyword, matched_method
+
+def merge_reference_section(matched_section, file_ext):
+    # 合併（PDF 斷行需要依參考文獻開頭重組）
+    if file_ext == "pdf":
+        ieee_refs = detect_and_split_ieee(matched_section)
+        merged_references = ieee_refs if ieee_refs else merge_references_by_heads(matched_section)
+    else:
+        merged_references = list(matched_section)
+
+    # 補丁：若第一筆為 Unknown 格式，合併第一、二筆段落
+    if len(merged_references) >= 2:
+        first_style = detect_reference_style(merged_references[0])
+        if first_style == "Unknown":
+            merged_references[0] = merged_references[0].strip() + " " + merged_references[1].strip()
+            del merged_references[1]  # 刪除原第二筆
+
+    return merged_references
+
+def split_references(merged_references):
+    """
+    含 2 個以上年份的段落強制切分
+    回傳：[(原始段落, 年份數, 切分後的參考文獻列表)]，未切分時列表只有原段落
+    """
+    groups = []
+    for para in merged_references:
+        total_valid_years = len(scan_reference(para).year_matches)
+        if total_valid_years >= 2:
+            groups.append((para, total_valid_years, split_multiple_apa_in_paragraph(para)))
+        else:
+            groups.append((para, total_valid_years, [para]))
+    return groups
+
+def title_pairs_from_groups(groups):
+    """
+    回傳可查詢的 (參考文獻, 標題)；擷取不到標題的略過
+    """
+    title_pairs = []
+    for _, _, refs in groups:
+        for ref in refs:
+            title = scan_reference(ref).title
+            if title:
+                title_pairs.append((ref, title))
+    return title_pairs
+
+def parse_document(filename, file, memory_check=None):
+    """
+    解析單一檔案：段落擷取 → 參考文獻區段 → 合併 → 切分 → 標題
+    file 可為路徑或 file-like 物件（例如 Streamlit UploadedFile）
+    格式不支援時回傳 None
+    """
+    file_ext = filename.split(".")[-1].lower()
+    if file_ext == "pdf":
+        return parse_pdf_tail_first(filename, file, memory_check=memory_check)
+    if file_ext == "docx":
+        return parse_docx_streaming(filename, file, memory_check=memory_check)
+
+    with stage("extract", filename):
+        paragraphs = extract_paragraphs(file, file_ext)
+    if paragraphs is None:
+        return None
+    if memory_check:
+        memory_check()
+    return parse_paragraphs(filename, file_ext, paragraphs)
+
+def parse_paragraphs(filename, file_ext, paragraphs):
+    """
+    parse_document 的後半段：由已擷取的段落找出參考文獻並切分
+    """
+    with stage("section", filename):
+        matched_section, matched_keyword, matched_method = extract_reference_section(paragraphs)
+    return build_parsed(filename, file_ext, matched_section, matched_keyword, matched_method)
+
+def build_parsed(filename, file_ext, matched_section, matched_keyword, matched_method):
+    with stage("merge", filename):
+        merged_references = merge_reference_section(matched_section, file_ext) if matched_section else []
+    with stage("split", filename):
+        groups = split_references(merged_references)
+    with stage("titles", filename):
+        title_pairs = title_pairs_from_groups(groups)
+
+    return {
+        "filename": filename,
+        "file_ext": file_ext,
+        "matched_section": matched_section,
+        "matched_keyword": matched_keyword,
+        "matched_method": matched_method,
+        "groups": groups,
+        "title_pairs": title_pairs,
+    }
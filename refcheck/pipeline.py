@@ -0,0 +1,198 @@
+import time
+from datetime import datetime
+from functools import partial
+
+from .document_cache import load_file_results, save_file_results
+from .ingest import MEMORY_BUDGET_MB, parse_within_budget, record_parse
+from .metrics import stage
+from .normalize import clean_title
+from .providers import (
+    lookup_reference,
+    reserve_serpapi_credits,
+    resolve_dois_batch,
+    search_local_title_index,
+    search_scopus_by_title,
+    search_scopus_by_titles_batch,
+)
+from .results import FileResults
+from .routing import flush_routing_stats, plan_route
+from .rules import extract_doi
+from .scheduler import run_lookups
+
+
+def now_str():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def new_file_results(filename, title_pairs, no_reference_section=False, parse_error=None):
+    return FileResults(
+        filename, title_pairs, report_time=now_str(),
+        parse_error=parse_error, no_reference_section=no_reference_section,
+    )
+
+
+# ========== 查詢 ==========
+def prefetch_lookups(all_file_results):
+    """
+    所有檔案的 DOI 先批次查詢 Crossref；沒有 DOI 或 DOI 未解析、且本地索引沒有完全相同標題的再批次查詢 Scopus
+    結果寫入查詢快取，逐筆查詢時直接命中；批次實際查到的 Scopus 結果計入路由統計（見 routing）
+    """
+    pairs = [(r.ref, r.title) for file_results in all_file_results for r in file_results.references]
+    resolved_dois = resolve_dois_batch([extract_doi(ref) for ref, _ in pairs])
+    pending = {
+        clean_title(title or ""): (ref, title) for ref, title in pairs
+        if (extract_doi(ref) or "").lower() not in resolved_dois and not search_local_title_index(title)[1]
+    }
+    fetched = search_scopus_by_titles_batch([title for _, title in pending.values()])
+    for key in fetched:
+        ref, title = pending[key]
+        plan_route(ref, title).record("scopus", bool(search_scopus_by_title(title)))
+    flush_routing_stats()
+
+
+# ========== 跨檔案去重 ==========
+def reference_key(ref, title, resolved_dois=()):
+    """
+    同一篇文獻的 key：DOI 可解析時用 DOI，否則用正規化後的標題（標題清洗後為空時用原文）
+    DOI 未解析時結果取決於標題，DOI 相同但標題不同的參考文獻不能共用結果，key 同時包含 DOI 與標題
+    resolved_dois：可解析的小寫 DOI（見 resolve_dois_batch）
+    """
+    doi = (extract_doi(ref) or "").lower()
+    if doi in resolved_dois:
+        return "doi:" + doi
+    cleaned = clean_title(title)
+    key = "title:" + cleaned if cleaned else "ref:" + ref
+    return f"doi:{doi}|{key}" if doi else key
+
+
+class LookupDedupe:
+    """
+    同一批檔案共用的查詢結果：key → (分類, 連結, 查詢紀錄, 查詢秒數)
+    同一實驗室的論文、同一篇論文的不同章節或版本常引用相同文獻，每個 key 只查一次
+    """
+
+    def __init__(self):
+        self.outcomes = {}
+        self.references = 0
+
+    @property
+    def saved(self):
+        # 省下的查詢數 = 參考文獻總數 - 實際查詢的 key 數
+        return self.references - len(self.outcomes)
+
+    def stats(self):
+        return {"references": self.references, "lookups": len(self.outcomes), "saved": self.saved}
+
+
+def timed_lookup(ref, title, credits=None):
+    start = time.perf_counter()
+    bucket, url, logs = lookup_reference(ref, title, credits=credits)
+    return bucket, url, logs, time.perf_counter() - start
+
+
+def lookup_file(file_results, on_progress=None, dedupe=None):
+    """
+    平行查詢單一檔案的所有參考文獻，每筆完成時即寫入 file_results（先前檔案已查過的文獻最先寫入），
+    查詢中的檔案結果可直接顯示
+    dedupe：跨檔案共用的 LookupDedupe；先前檔案已查過的文獻直接沿用結果
+    回傳 Google Scholar 查詢紀錄（依參考文獻順序）
+    """
+    references = file_results.references
+    if dedupe is None:
+        dedupe = LookupDedupe()
+
+    # 通常已由 prefetch_lookups 解析並寫入快取，這裡直接由快取取得
+    resolved_dois = resolve_dois_batch([extract_doi(r.ref) for r in references])
+    keys = [reference_key(r.ref, r.title, resolved_dois) for r in references]
+    pending = {}
+    indexes = {}  # key → 這個檔案中相同文獻的位置
+    for key, r in zip(keys, references):
+        indexes.setdefault(key, []).append(r.index)
+        if key not in dedupe.outcomes and key not in pending:
+            pending[key] = (r.ref, r.title)
+
+    for key, positions in indexes.items():
+        if key in dedupe.outcomes:
+            bucket, url, _, _ = dedupe.outcomes[key]
+            for i in positions:
+                file_results.set(i, bucket, url)
+    pending_keys = list(pending)
+
+    def on_lookup(idx, outcome):
+        bucket, url, _, seconds = outcome
+        # 查詢耗時記在第一筆，其餘相同的文獻沿用結果
+        for n, i in enumerate(indexes[pending_keys[idx]]):
+            file_results.set(i, bucket, url, seconds if n == 0 else 0.0)
+
+    # 依待查筆數預留 SerpAPI 額度，結束時歸還未用完的部分
+    with reserve_serpapi_credits(len(pending)) as credits:
+        lookups = run_lookups(
+            pending.values(), partial(timed_lookup, credits=credits), on_progress=on_progress, on_result=on_lookup,
+        )
+    flush_routing_stats()
+    dedupe.outcomes.update(zip(pending, lookups))
+    dedupe.references += len(references)
+    if on_progress and references and not pending:
+        on_progress(1, 1)
+
+    file_results.report_time = now_str()
+    return [line for key in keys for line in dedupe.outcomes[key][2]]
+
+
+# ========== 整批檔案（CLI / 背景程序用） ==========
+def results_from_parsed(filename, parsed, usage=None):
+    """
+    解析結果（見 ingest.parse_within_budget）→ 空白的檔案結果；格式不支援時回傳 None
+    """
+    if usage and usage["error"]:
+        return new_file_results(filename, [], parse_error=usage["error"])
+    if parsed is None:
+        return None
+    if not parsed["matched_section"]:
+        return new_file_results(filename, [], no_reference_section=True)
+    return new_file_results(filename, parsed["title_pairs"])
+
+
+def check_file(file_results, digest=None, on_progress=None, dedupe=None, prefetch=True):
+    """
+    查詢單一檔案；內容相同（digest）且查核流程未變動時直接取用先前的查核結果
+    prefetch：是否先批次查詢（呼叫端已對整批檔案執行 prefetch_lookups 時設為 False）
+    回傳：(檔案結果, Google Scholar 查詢紀錄, 是否取自快取)
+    """
+    cached = load_file_results(digest)
+    if cached is not None:
+        restored, scholar_logs = cached
+        restored.filename = file_results.filename
+        return restored, scholar_logs, True
+
+    filename = file_results.filename
+    if prefetch:
+        with stage("prefetch", filename):
+            prefetch_lookups([file_results])
+    with stage("lookup", filename):
+        scholar_logs = lookup_file(file_results, on_progress=on_progress, dedupe=dedupe)
+    save_file_results(digest, file_results, scholar_logs)
+    return file_results, scholar_logs, False
+
+
+def check_documents(documents, dedupe=None):
+    """
+    documents：[(檔名, file-like 或路徑)]
+    回傳每個檔案的查詢結果（格式不支援的檔案略過）；重複的參考文獻只查一次
+    """
+    parsed_files = []
+    for filename, file in documents:
+        parsed, usage = parse_within_budget(filename, file, MEMORY_BUDGET_MB)
+        record_parse(filename, usage)
+        file_results = results_from_parsed(filename, parsed, usage)
+        if file_results is not None:
+            parsed_files.append((file_results, parsed and parsed.get("digest")))
+
+    if dedupe is None:
+        dedupe = LookupDedupe()
+    with stage("prefetch"):
+        prefetch_lookups([file_results for file_results, _ in parsed_files])
+    return [
+        check_file(file_results, digest, dedupe=dedupe, prefetch=False)[0]
+        for file_results, digest in parsed_files
+    ]
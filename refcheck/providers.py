@@ -0,0 +1,427 @@
+import os
+import time
+import urllib.parse
+
+from . import http_client
+from .lookup_cache import cached_lookup, fetch_count, get_cache
+from .normalize import clean_title, clean_title_for_remedial
+from .routing import plan_route
+from .rules import extract_doi
+from .scheduler import run_lookups
+from .serpapi_budget import CreditsExhausted, get_budget, is_quota_error, reserve_credits
+from .similarity import score_many
+from .title_index import get_title_index, set_title_index_snapshot
+
+
+# ========== API Key 設定 ==========
+# 預設讀環境變數；Streamlit 介面與 CLI 會再呼叫 configure() 覆寫
+API_KEYS = {
+    "scopus": os.environ.get("SCOPUS_API_KEY", ""),
+    "serpapi": os.environ.get("SERPAPI_KEY", ""),
+}
+
+def configure(scopus_api_key=None, serpapi_key=None, crossref_mailto=None, title_index=None, api_base_url=None):
+    if scopus_api_key is not None:
+        API_KEYS["scopus"] = scopus_api_key
+    if serpapi_key is not None:
+        API_KEYS["serpapi"] = serpapi_key
+    if crossref_mailto is not None:
+        http_client.set_crossref_mailto(crossref_mailto)
+    if title_index is not None:
+        set_title_index_snapshot(title_index)
+    if api_base_url is not None:
+        http_client.set_base_url(api_base_url)
+
+def read_key_file(path):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+# ========== Crossref DOI 查詢 ==========
+def search_crossref_by_doi(doi):
+    def fetch():
+        url = http_client.endpoint("crossref", f"/works/{doi}")
+        try:
+            response = http_client.get("crossref", url)
+        except Exception:
+            return False, None
+        if response.status_code != 200:
+            return False, None
+        item = response.json().get("message", {})
+        titles = item.get("title")
+        title = titles[0] if isinstance(titles, list) and len(titles) > 0 else None
+        return True, {"title": title, "URL": item.get("URL")}
+
+    # DOI 不分大小寫，統一小寫作為快取 key
+    ok, item = cached_lookup("crossref", doi.lower(), fetch)
+    if not ok:
+        return None, None
+    return item["title"], item["URL"]
+
+# ========== Crossref DOI 批次查詢 ==========
+CROSSREF_BATCH_SIZE = 50
+
+def resolve_dois_batch(dois, batch_size=CROSSREF_BATCH_SIZE):
+    """
+    以 filter=doi:...,doi:... 一次解析多筆 DOI，只取回 DOI、title、URL 欄位
+    - 結果寫入查詢快取，之後 search_crossref_by_doi 會直接命中
+    - 批次中查無的 DOI 不寫入快取，仍交由逐筆查詢確認
+    回傳：{小寫 DOI: (title, URL)}；沒有標題的 DOI 不算解析（同 lookup_reference，仍要以標題查詢）
+    """
+    cache = get_cache()
+    resolved = {}
+    pending = []
+    for doi in dict.fromkeys(d.lower() for d in dois if d):
+        hit, ok, item = cache.get("crossref", doi)
+        if not hit:
+            pending.append(doi)
+        elif ok and item["title"]:
+            resolved[doi] = (item["title"], item["URL"])
+
+    def fetch_batch(batch):
+        params = {
+            "filter": ",".join(f"doi:{doi}" for doi in batch),
+            "select": "DOI,title,URL",
+            "rows": len(batch),
+        }
+        try:
+            response = http_client.get("crossref", http_client.endpoint("crossref", "/works"), params=params)
+        except Exception:
+            return None
+        if response.status_code != 200:
+            return None
+        items = {}
+        for item in response.json().get("message", {}).get("items", []):
+            titles = item.get("title")
+            title = titles[0] if isinstance(titles, list) and len(titles) > 0 else None
+            items[item.get("DOI", "").lower()] = {"title": title, "URL": item.get("URL")}
+        return items
+
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    for batch, items in zip(batches, run_lookups([(b,) for b in batches], fetch_batch)):
+        if items is None:
+            continue  # 整批失敗：交給逐筆查詢
+        for doi in batch:
+            item = items.get(doi)
+            if item:
+                cache.set("crossref", doi, item)
+                if item["title"]:
+                    resolved[doi] = (item["title"], item["URL"])
+
+    return resolved
+
+
+# ========== Scopus 查詢 ==========
+def search_scopus_by_title(title):
+    base_url = http_client.endpoint("scopus", "/content/search/scopus")
+    headers = {
+        "Accept": "application/json",
+        "X-ELS-APIKey": API_KEYS["scopus"]
+    }
+    params = {
+        "query": f'TITLE("{title}")',
+        "count": 3
+    }
+
+    def fetch():
+        try:
+            response = http_client.get("scopus", base_url, params=params, headers=headers)
+        except Exception:
+            return False, None
+        if response.status_code != 200:
+            return False, None
+        data = response.json()
+        entries = data.get('search-results', {}).get('entry', [])
+        # 只保留比對需要的欄位
+        return True, [
+            {"dc:title": e.get('dc:title', ''), "prism:url": e.get('prism:url', 'https://www.scopus.com')}
+            for e in entries
+        ]
+
+    ok, entries = cached_lookup("scopus", clean_title(title), fetch)
+    if ok:
+        for entry in entries:
+            doc_title = entry.get('dc:title', '')
+            if doc_title.strip().lower() == title.strip().lower():
+                return entry.get('prism:url', 'https://www.scopus.com')
+    return None
+
+# ========== Scopus 批次查詢 ==========
+SCOPUS_BATCH_SIZE = 10          # 每次 OR 合併的標題數
+SCOPUS_MAX_COUNT = 25           # 單次查詢最多取回筆數
+SCOPUS_MAX_QUERY_CHARS = 2000   # 查詢字串過長時先拆半
+
+def search_scopus_by_titles_batch(titles, batch_size=SCOPUS_BATCH_SIZE):
+    """
+    把多個 TITLE("...") 以 OR 合併成一次查詢，再依 clean_title 把回傳的 dc:title 分回各標題
+    - 回傳結果未被截斷時，每個標題的比對結果寫入快取（含查無），search_scopus_by_title 直接命中
+    - 回傳結果被截斷時，只快取已找到完全相符的標題，其餘交由逐筆查詢
+    - 查詢過長或被 Scopus 拒絕（400/413/414）時拆半重試
+    回傳：這次實際查詢並寫入快取的 clean_title
+    """
+    cache = get_cache()
+    pending = {}  # clean_title → 原標題
+    for title in titles:
+        key = clean_title(title or "")
+        if key and key not in pending and not cache.get("scopus", key)[0]:
+            pending[key] = title
+
+    headers = {
+        "Accept": "application/json",
+        "X-ELS-APIKey": API_KEYS["scopus"]
+    }
+    fetched = []
+
+    def fetch_batch(keys):
+        query = " OR ".join(f'TITLE("{pending[k]}")' for k in keys)
+        if len(keys) > 1 and len(query) > SCOPUS_MAX_QUERY_CHARS:
+            half = len(keys) // 2
+            fetch_batch(keys[:half])
+            fetch_batch(keys[half:])
+            return
+
+        params = {
+            "query": query,
+            "count": min(SCOPUS_MAX_COUNT, 3 * len(keys))
+        }
+        try:
+            response = http_client.get("scopus", http_client.endpoint("scopus", "/content/search/scopus"), params=params, headers=headers)
+        except Exception:
+            return
+        if response.status_code in (400, 413, 414) and len(keys) > 1:
+            half = len(keys) // 2
+            fetch_batch(keys[:half])
+            fetch_batch(keys[half:])
+            return
+        if response.status_code != 200:
+            return  # 交給逐筆查詢
+
+        results = response.json().get('search-results', {})
+        entries = results.get('entry', [])
+        try:
+            truncated = int(results.get('opensearch:totalResults', 0)) > len(entries)
+        except (TypeError, ValueError):
+            truncated = True
+
+        grouped = {}
+        for e in entries:
+            doc_title = e.get('dc:title', '')
+            grouped.setdefault(clean_title(doc_title), []).append(
+                {"dc:title": doc_title, "prism:url": e.get('prism:url', 'https://www.scopus.com')}
+            )
+
+        for key in keys:
+            matched = grouped.get(key, [])
+            exact = any(m["dc:title"].strip().lower() == pending[key].strip().lower() for m in matched)
+            if exact or not truncated:
+                cache.set("scopus", key, matched)
+                fetched.append(key)
+
+    keys = list(pending)
+    batches = [keys[i:i + batch_size] for i in range(0, len(keys), batch_size)]
+    run_lookups([(b,) for b in batches], fetch_batch)
+    return fetched
+
+# ========== 本地標題索引 ==========
+def search_local_title_index(title):
+    """
+    在本地索引（見 title_index）中查標題
+    回傳：(連結, 是否完全相同)；未設定索引或找不到時回傳 (None, False)
+    只有完全相同才算命中；類似標題僅供紀錄。快照沒有連結時改給 Google Scholar 搜尋連結
+    """
+    index = get_title_index()
+    if index is None:
+        return None, False
+    hit = index.lookup(title)
+    if hit is None:
+        return None, False
+    local_title, url, _, _, exact = hit
+    return url or f"https://scholar.google.com/scholar?q={urllib.parse.quote(local_title)}", exact
+
+# ========== Serpapi 查詢 ==========
+# 查詢錯誤寫進該筆參考文獻的查詢紀錄，由呼叫端（例如背景工作）從紀錄取出，不同工作互不影響
+SERPAPI_ERROR_LOG_PREFIX = "Google Scholar 查詢錯誤："
+
+def serpapi_error_from_logs(logs):
+    """
+    查詢紀錄中最後一次的 SerpAPI 錯誤訊息；沒有錯誤時回傳 None
+    """
+    errors = [line[len(SERPAPI_ERROR_LOG_PREFIX):] for line in logs if line.startswith(SERPAPI_ERROR_LOG_PREFIX)]
+    return errors[-1] if errors else None
+
+def reserve_serpapi_credits(references):
+    """
+    為一批查詢預留 SerpAPI 額度（見 serpapi_budget）；用法：with reserve_serpapi_credits(n) as credits: ...
+    """
+    return reserve_credits(references, API_KEYS["serpapi"])
+
+def spend_serpapi_credit(credits, remedial=False):
+    """
+    查詢送出前扣減額度（快取命中不扣）；額度不足時拋出 CreditsExhausted
+    credits 為 None（未預留）時只檢查是否已用完
+    """
+    if credits is not None:
+        allowed = credits.spend(remedial=remedial)
+    else:
+        allowed = not (get_budget().exhausted or (remedial and get_budget().low()))
+    if not allowed:
+        raise CreditsExhausted()
+
+def check_quota_error(message):
+    if is_quota_error(message):
+        get_budget().mark_exhausted()
+        raise CreditsExhausted()
+
+def search_scholar_by_title(title, api_key, threshold=0.90, credits=None, logs=None):
+    search_url = f"https://scholar.google.com/scholar?q={urllib.parse.quote(title)}"
+    params = {
+        "engine": "google_scholar",
+        "q": title,
+        "api_key": api_key,
+        "num": 3
+    }
+
+    def fetch():
+        spend_serpapi_credit(credits)
+        try:
+            results = http_client.serpapi_search(params)
+        except Exception as e:
+            return False, {"error": f"API 查詢錯誤：{e}"}
+        if "error" in results:
+            check_quota_error(results["error"])
+            return False, {"error": results["error"]}
+        return True, [r.get("title", "") for r in results.get("organic_results", [])]
+
+    cleaned_query = clean_title(title)
+    try:
+        ok, payload = cached_lookup("scholar_title", cleaned_query, fetch)
+    except CreditsExhausted:
+        return search_url, "exceeded"
+    if not ok:
+        if logs is not None:
+            logs.append(SERPAPI_ERROR_LOG_PREFIX + payload["error"])
+        return search_url, "error"
+
+    organic = payload
+    if not organic:
+        return search_url, "no_result"
+
+    # 所有結果一次評分；確定達不到門檻的候選不必算完整相似度
+    cleaned_results = [clean_title(result_title) for result_title in organic]
+    scores = score_many(cleaned_query, cleaned_results, threshold)
+    for cleaned_result, score in zip(cleaned_results, scores):
+        if not cleaned_query or not cleaned_result:
+            continue
+
+        if cleaned_query == cleaned_result:
+            return search_url, "match"
+        if score >= threshold:
+            return search_url, "similar"
+
+    return search_url, "no_result"
+
+
+#補救搜尋
+def search_scholar_by_ref_text(ref_text, api_key, credits=None):
+    search_url = f"https://scholar.google.com/scholar?q={urllib.parse.quote(ref_text)}"
+    params = {
+        "engine": "google_scholar",
+        "q": ref_text,
+        "api_key": api_key,
+        "num": 1
+    }
+
+    def fetch():
+        # 剩餘額度偏低時略過補救查詢，額度留給其他參考文獻的標題查詢
+        spend_serpapi_credit(credits, remedial=True)
+        try:
+            results = http_client.serpapi_search(params)
+        except Exception:
+            return False, None
+        if "error" in results:
+            check_quota_error(results["error"])
+            return False, None
+        return True, [r.get("title", "") for r in results.get("organic_results", [])[:1]]
+
+    try:
+        ok, organic = cached_lookup("scholar_ref", clean_title(ref_text), fetch)
+    except CreditsExhausted:
+        return search_url, "skipped"
+    if not ok:
+        return search_url, "no_result"
+
+    if not organic:
+        return search_url, "no_result"
+
+    first_title = organic[0]
+
+    # 使用乾淨版清洗（不影響主流程）
+    cleaned_ref = clean_title_for_remedial(ref_text)
+    cleaned_first = clean_title_for_remedial(first_title)
+
+    if cleaned_first in cleaned_ref or cleaned_ref in cleaned_first:
+        return search_url, "remedial"
+
+    return search_url, "no_result"
+
+
+# ========== 單筆查詢流程（Crossref → 本地索引 → Scopus / Scholar（見 routing）→ 補救） ==========
+def lookup_reference(ref, title, credits=None):
+    """
+    對單筆參考文獻執行完整查詢流程，可在背景執行緒中呼叫
+    credits：SerpAPI 預留額度（見 reserve_serpapi_credits）
+    回傳：(分類, 連結, 查詢紀錄)
+    分類為 crossref_doi_hits / local_hits / scopus_hits / scholar_hits / scholar_similar / scholar_remedial /
+    serpapi_exceeded（SerpAPI 額度不足，標題查詢或補救查詢未送出）/ not_found
+    """
+    logs = []
+    doi = extract_doi(ref)
+    if doi:
+        title_from_doi, url = search_crossref_by_doi(doi)
+        if title_from_doi:
+            return "crossref_doi_hits", url, logs
+
+    # 本地索引標題完全相同才算命中、不再呼叫 Scopus / SerpAPI；類似標題照常往下查
+    url, exact = search_local_title_index(title)
+    if exact:
+        return "local_hits", url, logs
+    if url:
+        logs.append(f"本地索引僅找到類似標題，繼續查詢 / 標題：{title}")
+
+    # 預設固定順序 Scopus → Google Scholar；REFCHECK_ROUTING=adaptive 時依同類參考文獻過去的命中率調整先後（見 routing）
+    # 兩者都會查、不略過；類似標題要等 Scopus 也查無才採用。統計只記實際送出的查詢，快取命中不算
+    route = plan_route(ref, title)
+    gs_url = gs_type = None
+    for provider in route.providers:
+        start, fetches = time.perf_counter(), fetch_count()
+        if provider == "scopus":
+            url = search_scopus_by_title(title)
+            if fetch_count() > fetches:
+                route.record("scopus", bool(url), time.perf_counter() - start)
+            if url:
+                return "scopus_hits", url, logs
+        else:
+            gs_url, gs_type = search_scholar_by_title(title, API_KEYS["serpapi"], credits=credits, logs=logs)
+            logs.append(f"Google Scholar 回傳類型：{gs_type} / 標題：{title}")
+            if gs_type in ("match", "similar", "no_result") and fetch_count() > fetches:
+                route.record("scholar", gs_type == "match", time.perf_counter() - start)
+            if gs_type == "match":
+                return "scholar_hits", gs_url, logs
+
+    if gs_type == "similar":
+        return "scholar_similar", gs_url, logs
+    if gs_type == "exceeded":
+        return "serpapi_exceeded", None, logs
+    if gs_type == "error":
+        return "not_found", None, logs
+
+    remedial_url, remedial_type = search_scholar_by_ref_text(ref, API_KEYS["serpapi"], credits=credits)
+    logs.append(f"Google Scholar 回傳類型：remedial_{remedial_type} / 標題：{title}")
+    if remedial_type == "skipped":
+        # 額度不足而未做補救查詢，不能算查無結果（也不寫入文件快取，額度恢復後重新查詢）
+        return "serpapi_exceeded", None, logs
+    if remedial_type == "remedial":
+        return "scholar_remedial", remedial_url, logs
+    return "not_found", None, logs
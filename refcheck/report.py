@@ -0,0 +1,141 @@
+import json
+import urllib.parse
+from io import StringIO
+
+from .metrics import METRICS_COLUMNS, export_rows
+from .results import Status
+
+
+EXPORT_COLUMNS = ["檔案名稱", "原始參考文獻", "查核結果", "連結"]
+
+# 匯出時的分類順序與說明文字
+STATUS_LABELS = [
+    (Status.CROSSREF_DOI, "Crossref 有 DOI 資訊"),
+    (Status.LOCAL, "標題命中（本地索引）"),
+    (Status.SCOPUS, "標題命中（Scopus）"),
+    (Status.SCHOLAR, "標題命中（Google Scholar）"),
+    (Status.SCHOLAR_SIMILAR, "Google Scholar 類似標題"),
+    (Status.SCHOLAR_REMEDIAL, "Google Scholar 補救命中"),
+]
+
+SERPAPI_EXCEEDED_LABEL = "未查完 Google Scholar（SerpAPI 額度不足）"
+
+REPORT_NOTICE = (
+    "說明：\n"
+    "為節省核對時間，本系統只查對有DOI碼的期刊論文。且並未檢查期刊名稱、作者、卷期、頁碼。只針對篇名進行核對。\n"
+    "本系統只是為了提供初步篩選，比對後應接著進行人工核對，任何人都不應該以本系統核對結果作為任何學術倫理判斷之基礎。\n\n"
+)
+
+
+def scholar_search_url(text):
+    return f"https://scholar.google.com/scholar?q={urllib.parse.quote(text)}"
+
+
+# ========== 匯出資料列 ==========
+def build_export_rows(results):
+    """
+    每個檔案的參考文獻依序走訪一次，依分類產生 [檔案名稱, 原始參考文獻, 查核結果, 連結]
+    """
+    labels = dict(STATUS_LABELS)
+    export_data = []
+    for result in results:
+        filename = result.filename
+
+        if result.parse_error:
+            export_data.append([filename, "", f"未處理：{result.parse_error}", ""])
+            continue
+        if result.no_reference_section:
+            export_data.append([
+                filename,
+                "",
+                "查無結果：未解析出參考文獻段落",
+                ""
+            ])
+            continue
+
+        rows_before = len(export_data)
+        for r in result.references:
+            if r.status in labels:
+                export_data.append([filename, r.ref, labels[r.status], r.url])
+            elif r.status is Status.NOT_FOUND:
+                export_data.append([filename, r.ref, "查無結果", scholar_search_url(r.ref)])
+            elif r.status is Status.SERPAPI_EXCEEDED:
+                export_data.append([filename, r.ref, SERPAPI_EXCEEDED_LABEL, scholar_search_url(r.ref)])
+
+        # fallback 1：完全沒有擷取參考文獻
+        if not result.references:
+            export_data.append([
+                filename,
+                "",
+                "查無結果：無命中也無段落",
+                ""
+            ])
+        # fallback 2：有參考文獻但全部都沒有結果（例如尚未查詢）
+        elif len(export_data) == rows_before:
+            export_data.append([
+                filename,
+                "",
+                "查無結果：所有參考文獻均未命中",
+                ""
+            ])
+    return export_data
+
+
+# ========== 統計 ==========
+def summarize(results):
+    """
+    各分類筆數直接加總各檔案的 counts（見 results.FileResults），不重新走訪參考文獻
+    """
+    summary = {
+        "total_files": len(results),
+        "total_refs": sum(len(r.references) for r in results),
+    }
+    for status in Status:
+        if status is not Status.PENDING:
+            summary[status.value] = sum(r.counts[status] for r in results)
+    return summary
+
+
+# ========== CSV / JSON ==========
+def build_csv(results, report_time, metrics=None):
+    """
+    metrics：效能統計（見 metrics.since），有提供時附加在查核結果之後
+    """
+    # pandas 載入約需 0.5 秒，匯出時才匯入，不拖慢介面啟動與解析行程
+    import pandas as pd
+
+    header = f"報告產出時間：{report_time}\n\n" + REPORT_NOTICE
+    export_data = build_export_rows(results)
+
+    csv_buffer = StringIO()
+    csv_buffer.write(header)
+    if not export_data:
+        csv_buffer.write(header)
+        df_export = pd.DataFrame([[
+            "（無檔案）",
+            "",
+            "⚠️ 沒有可匯出的查核結果（全部檔案皆無資料）",
+            ""
+        ]], columns=EXPORT_COLUMNS)
+    else:
+        df_export = pd.DataFrame(export_data, columns=EXPORT_COLUMNS)
+
+    df_export.to_csv(csv_buffer, index=False)
+    if metrics is not None:
+        csv_buffer.write("\n效能統計\n")
+        pd.DataFrame(export_rows(metrics), columns=METRICS_COLUMNS).to_csv(csv_buffer, index=False)
+    return csv_buffer.getvalue()
+
+
+def build_json(results, report_time, lookup_stats=None, metrics=None):
+    data = {
+        "report_time": report_time,
+        "summary": summarize(results),
+        "rows": [dict(zip(EXPORT_COLUMNS, row)) for row in build_export_rows(results)],
+    }
+    if lookup_stats is not None:
+        # 參考文獻總數、實際查詢數、重複文獻省下的查詢數（見 pipeline.LookupDedupe）
+        data["lookup_stats"] = lookup_stats
+    if metrics is not None:
+        data["metrics"] = metrics
+    return json.dumps(data, ensure_ascii=False, indent=2)
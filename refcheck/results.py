@@ -0,0 +1,120 @@
+from enum import Enum
+
+
+# ========== 查詢結果分類 ==========
+class Status(str, Enum):
+    """
+    單筆參考文獻的查詢結果；值與 lookup_reference 回傳的分類名稱相同，可直接與字串比較、存成 JSON
+    """
+    CROSSREF_DOI = "crossref_doi_hits"
+    LOCAL = "local_hits"
+    SCOPUS = "scopus_hits"
+    SCHOLAR = "scholar_hits"
+    SCHOLAR_SIMILAR = "scholar_similar"
+    SCHOLAR_REMEDIAL = "scholar_remedial"
+    NOT_FOUND = "not_found"
+    SERPAPI_EXCEEDED = "serpapi_exceeded"  # SerpAPI 額度不足、未查完 Google Scholar
+    PENDING = "pending"                    # 尚未查詢（或查詢中）
+
+
+# 介面「命中結果」分頁包含的分類
+MATCHED = (Status.CROSSREF_DOI, Status.LOCAL, Status.SCOPUS, Status.SCHOLAR, Status.SCHOLAR_REMEDIAL)
+
+# 介面「均查無結果」分頁包含的分類
+MISSED = (Status.NOT_FOUND, Status.SERPAPI_EXCEEDED)
+
+# 提供結果的查詢來源
+PROVIDERS = {
+    Status.CROSSREF_DOI: "crossref",
+    Status.LOCAL: "local",
+    Status.SCOPUS: "scopus",
+    Status.SCHOLAR: "scholar",
+    Status.SCHOLAR_SIMILAR: "scholar",
+    Status.SCHOLAR_REMEDIAL: "scholar",
+}
+
+
+# ========== 單筆參考文獻 ==========
+class ReferenceResult:
+    """
+    index 為參考文獻在檔案中的位置（從 0 開始），內容相同的參考文獻各自一筆
+    seconds 為查詢耗時；沿用其他參考文獻結果或取自快取時為 0
+    """
+    __slots__ = ("index", "ref", "title", "status", "url", "seconds")
+
+    def __init__(self, index, ref, title, status=Status.PENDING, url=None, seconds=0.0):
+        self.index = index
+        self.ref = ref
+        self.title = title
+        self.status = status
+        self.url = url
+        self.seconds = seconds
+
+    @property
+    def provider(self):
+        return PROVIDERS.get(self.status)
+
+
+# ========== 單一檔案 ==========
+class FileResults:
+    """
+    單一檔案的查詢結果：references[i] 為第 i 筆參考文獻；各分類筆數（counts）隨 set() 更新，不必重新計算
+    parse_error：解析失敗（例如超過記憶體上限）；no_reference_section：找不到參考文獻段落
+    """
+    __slots__ = ("filename", "references", "counts", "report_time", "parse_error", "no_reference_section")
+
+    def __init__(self, filename, title_pairs, report_time=None, parse_error=None, no_reference_section=False):
+        self.filename = filename
+        self.references = [ReferenceResult(i, ref, title) for i, (ref, title) in enumerate(title_pairs)]
+        self.counts = dict.fromkeys(Status, 0)
+        self.counts[Status.PENDING] = len(self.references)
+        self.report_time = report_time
+        self.parse_error = parse_error
+        self.no_reference_section = no_reference_section
+
+    @property
+    def title_pairs(self):
+        return [(r.ref, r.title) for r in self.references]
+
+    def set(self, index, status, url=None, seconds=0.0):
+        record = self.references[index]
+        status = Status(status)
+        self.counts[record.status] -= 1
+        self.counts[status] += 1
+        record.status = status
+        record.url = url
+        record.seconds = seconds
+
+    def with_status(self, *statuses):
+        return [r for r in self.references if r.status in statuses]
+
+    def count(self, *statuses):
+        return sum(self.counts[status] for status in statuses)
+
+    # ----- 儲存（文件快取、背景工作）：以欄為單位的 JSON，不重複存分類名稱 -----
+    def to_dict(self):
+        data = {
+            "filename": self.filename,
+            "report_time": self.report_time,
+            "refs": [r.ref for r in self.references],
+            "titles": [r.title for r in self.references],
+            "status": [r.status.value for r in self.references],
+            "urls": [r.url for r in self.references],
+            "seconds": [round(r.seconds, 3) for r in self.references],
+        }
+        if self.parse_error:
+            data["parse_error"] = self.parse_error
+        if self.no_reference_section:
+            data["no_reference_section"] = True
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        file_results = cls(
+            data["filename"], zip(data["refs"], data["titles"]), report_time=data.get("report_time"),
+            parse_error=data.get("parse_error"), no_reference_section=data.get("no_reference_section", False),
+        )
+        for i, (status, url, seconds) in enumerate(zip(data["status"], data["urls"], data["seconds"])):
+            if status != Status.PENDING:
+                file_results.set(i, status, url, seconds)
+        return file_results
@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import threading
+import zlib
+
+from .lookup_cache import CACHE_DIR
+from .rules import scan_reference
+
+
+# ========== 查詢路由設定 ==========
+# fixed：固定順序（預設）；adaptive：依過去的命中率調整 Scopus / Google Scholar 的順序，不略過任何查詢
+ROUTING_MODE = os.environ.get("REFCHECK_ROUTING", "fixed")
+
+# 各特徵（格式、標題文字、有無 DOI）的命中統計，跨次執行保留
+ROUTING_STATS_PATH = os.path.join(CACHE_DIR, "routing_stats.sqlite3")
+
+# 標題查詢的預設順序；補救查詢一律在最後
+DEFAULT_ORDER = ("scopus", "scholar")
+
+# 樣本數達此值才依統計調整
+MIN_SAMPLES = 30
+
+# 仍依預設順序查詢的比例，讓排在後面的查詢持續有新的統計（依標題決定，同一標題每次結果相同）
+EXPLORE_PERCENT = 5
+
+# 成本（秒）：平均延遲 + 每次 SerpAPI 額度折算的秒數
+CREDIT_COST_SECONDS = 5.0
+PROVIDER_CREDITS = {"scopus": 0, "scholar": 1}
+DEFAULT_LATENCY = {"scopus": 1.0, "scholar": 2.0}
+
+# CJK 字元占標題文字的比例達此值視為中日韓文標題
+CJK_RATIO = 0.3
+
+
+# ========== 特徵 ==========
+def is_cjk(ch):
+    return "一" <= ch <= "鿿" or "㐀" <= ch <= "䶿" or "぀" <= ch <= "ヿ" or "가" <= ch <= "힯"
+
+
+def title_script(title):
+    letters = [ch for ch in title or "" if ch.isalpha()]
+    if not letters:
+        return "none"
+    return "cjk" if sum(map(is_cjk, letters)) >= CJK_RATIO * len(letters) else "latin"
+
+
+def reference_features(ref, title):
+    """
+    統計的 key：參考文獻格式 / 標題文字 / 有無 DOI，例如 "APA/cjk/nodoi"
+    """
+    scan = scan_reference(ref)
+    return f"{scan.style}/{title_script(title)}/{'doi' if scan.doi else 'nodoi'}"
+
+
+# ========== 統計 ==========
+class RoutingStats:
+    """
+    (特徵, 查詢來源) → 命中 / 未命中次數；各查詢來源的網路延遲另以特徵 "*" 累計
+    只記錄實際送出網路請求的查詢（快取命中不算新樣本）；新增的次數先記在記憶體，flush() 時才寫入 SQLite
+    """
+
+    def __init__(self, path=ROUTING_STATS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._counts = {}   # (feature, provider) → [hits, misses, seconds, timed_calls]
+        self._pending = {}  # 尚未寫入的增量，格式同上
+        self._load()
+
+    def _connect(self):
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS routing_stats (
+                feature  TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                hits     INTEGER NOT NULL DEFAULT 0,
+                misses   INTEGER NOT NULL DEFAULT 0,
+                seconds  REAL NOT NULL DEFAULT 0,
+                calls    INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (feature, provider)
+            )
+        """)
+        return conn
+
+    def _load(self):
+        try:
+            with self._connect() as conn:
+                for feature, provider, *values in conn.execute("SELECT * FROM routing_stats"):
+                    self._counts[(feature, provider)] = list(values)
+        except sqlite3.Error:
+            pass
+
+    def _add(self, key, hits, misses, seconds, calls):
+        for table in (self._counts, self._pending):
+            entry = table.setdefault(key, [0, 0, 0.0, 0])
+            entry[0] += hits
+            entry[1] += misses
+            entry[2] += seconds
+            entry[3] += calls
+
+    def record(self, feature, provider, hit, seconds=None):
+        # seconds 為 None：批次查詢的結果，沒有單筆延遲
+        with self._lock:
+            self._add((feature, provider), int(hit), int(not hit), 0.0, 0)
+            if seconds is not None:
+                self._add(("*", provider), 0, 0, seconds, 1)
+
+    def hit_rate(self, feature, provider):
+        """
+        回傳 (平滑後的命中率, 樣本數)
+        """
+        hits, misses, _, _ = self._counts.get((feature, provider), (0, 0, 0.0, 0))
+        return (hits + 1) / (hits + misses + 2), hits + misses
+
+    def latency(self, provider):
+        _, _, seconds, calls = self._counts.get(("*", provider), (0, 0, 0.0, 0))
+        return seconds / calls if calls else DEFAULT_LATENCY[provider]
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            with self._connect() as conn:
+                conn.executemany("""
+                    INSERT INTO routing_stats (feature, provider, hits, misses, seconds, calls)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (feature, provider) DO UPDATE SET
+                        hits = hits + excluded.hits, misses = misses + excluded.misses,
+                        seconds = seconds + excluded.seconds, calls = calls + excluded.calls
+                """, [(f, p, *values) for (f, p), values in pending.items()])
+        except sqlite3.Error:
+            pass  # 統計寫不進去不影響查詢
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def get_routing_stats():
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = RoutingStats()
+        return _stats
+
+
+# ========== 路由 ==========
+class Route:
+    """
+    單筆參考文獻的查詢計畫
+    - providers：Scopus 與 Google Scholar 標題查詢的順序（兩者都會查，只是先後不同）
+    """
+    __slots__ = ("feature", "providers")
+
+    def __init__(self, feature, providers):
+        self.feature = feature
+        self.providers = providers
+
+    def record(self, provider, hit, seconds=None):
+        if self.feature is not None:
+            get_routing_stats().record(self.feature, provider, hit, seconds)
+
+
+def exploring(title):
+    return zlib.crc32((title or "").encode("utf-8")) % 100 < EXPLORE_PERCENT
+
+
+def expected_cost(stats, provider):
+    return stats.latency(provider) + CREDIT_COST_SECONDS * PROVIDER_CREDITS[provider]
+
+
+def plan_route(ref, title):
+    """
+    - 樣本不足時維持原本順序（Scopus → Google Scholar → 補救）
+    - 依「成本 / 命中率」由小到大排序 Scopus 與 Google Scholar；不略過任何查詢，補救查詢照常進行
+    - Google Scholar 先查且命中時不再查 Scopus，固定順序下的 scopus_hits 會列為 scholar_hits（見 lookup_reference）
+    """
+    if ROUTING_MODE != "adaptive":
+        return Route(None, DEFAULT_ORDER)
+    feature = reference_features(ref, title)
+    stats = get_routing_stats()
+    if exploring(title):
+        return Route(feature, DEFAULT_ORDER)
+
+    providers = list(DEFAULT_ORDER)
+    if all(stats.hit_rate(feature, p)[1] >= MIN_SAMPLES for p in providers):
+        providers.sort(key=lambda p: expected_cost(stats, p) / stats.hit_rate(feature, p)[0])
+    return Route(feature, tuple(providers))
+
+
+def flush_routing_stats():
+    if _stats is not None:
+        _stats.flush()
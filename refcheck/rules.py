@@ -0,0 +1,241 @@
+import re
+from functools import lru_cache
+
+# 清洗標題的實作在 normalize；保留從 rules 匯入的寫法
+from .normalize import clean_title, clean_title_for_remedial  # noqa: F401
+
+
+# ========== 擷取 DOI ==========
+DOI_RE = re.compile(r'(10\.\d{4,9}/[-._;()/:A-Z0-9]+)', re.I)
+DOI_PREFIXED_RE = re.compile(r'doi:\s*(https?://doi\.org/)?(10\.\d{4,9}/[-._;()/:A-Z0-9]+)', re.I)
+
+def extract_doi(text):
+    match = DOI_RE.search(text)
+    if match:
+        return match.group(1).rstrip(".")
+
+    doi_match = DOI_PREFIXED_RE.search(text)
+    if doi_match:
+        return doi_match.group(2).rstrip(".")
+
+    return None
+
+
+# ========================================= 所有規則封裝  =========================================
+# ========== 預先編譯的規則樣式 ==========
+APA_YEAR_RE = re.compile(r'[（(](\d{4}[a-c]?|n\.d\.)[）)]?[。\.]?', re.IGNORECASE)
+APA_TITLE_RE = re.compile(
+    r'[（(](\d{4}[a-c]?|n\.d\.)[）)]\s*[\.,，。]?\s*(.+?)(?:(?<!\d)[,，.。](?!\d)|$)',
+    re.IGNORECASE
+)
+APALIKE_YEAR_RE = re.compile(r'[,，.。]\s*(\d{4}[a-c]?)[.。，]')
+APALIKE_ZH_YEAR_RE = re.compile(r'，\s*(\d{4}[a-c]?)\s*，\s*。')
+APALIKE_TITLE_RE = re.compile(r'[,，.。]\s*(\d{4}[a-c]?)(?:[.。，])+\s*(.*?)(?:(?<!\d)[,，.。](?!\d)|$)')
+APALIKE_ZH_TITLE_RE = re.compile(r'，\s*(\d{4}[a-c]?)\s*，\s*。[ \t]*(.+?)(?:[，。]|$)')
+# 年份後接 .1、.v06 等 DOI 結尾
+DOI_TAIL_RE = re.compile(r'\.(\d{1,2}|[a-z0-9]{2,})', re.IGNORECASE)
+# arXiv 尾巴，例如 arXiv:xxxx.xxxxx, 2023（group 1 為其後的年份）
+ARXIV_YEAR_RE = re.compile(r'arxiv:\d{4}\.\d{5}[^a-zA-Z0-9]{0,3}\s*[,，]?\s*(\d{4}[a-c]?)', re.IGNORECASE)
+IEEE_HEAD_RE = re.compile(r'^\[\d+\]')
+IEEE_QUOTED_RE = re.compile(r'"([^"]+)"')
+IEEE_FALLBACK_RE = re.compile(r'(?<!et al)([A-Z][^,.]+[a-zA-Z])[,\.]')
+DIGIT_RE = re.compile(r'\d')
+APPENDIX_HEADING_RE = re.compile(
+    r'^([【〔（(]?\s*)?((\d+|[IVXLCDM]+|[一二三四五六七八九十壹貳參肆伍陸柒捌玖拾]+)[、．. ]?)?\s*(附錄|APPENDIX)(\s*[】〕）)]?)?$',
+    re.IGNORECASE
+)
+
+# ========== 年份規則 ==========
+def is_valid_year(year_str):
+    try:
+        year = int(year_str)
+        return 1000 <= year <= 2050
+    except:
+        return False
+
+def has_digit_before(ref_text, pos):
+    # 年份前 5 字元內有數字（排除 887(2020)、3.2020. 這類情況）
+    return DIGIT_RE.search(ref_text, max(0, pos - 5), pos) is not None
+
+# ========== 抓附錄 ========== 
+def is_appendix_heading(text):
+    return bool(APPENDIX_HEADING_RE.match(text.strip()))
+
+# ========== APA規則 ==========    
+def find_apa(ref_text):
+    """
+    判斷一段參考文獻是否為 APA 格式（標準括號年份 or n.d.）
+    標準格式：Lin, J. (2020). Title.
+    支援變體：中英文括號、句號符號、n.d. 年份
+    """
+    return scan_reference(ref_text).apa
+
+def match_apa_title_section(ref_text):
+    """
+    擷取 APA 結構中的標題段落（位於年份後）
+    範例：Lin, J. (2020). Title here.
+    - 支援標點：.、。 、,
+    - 避免誤抓數字中的逗號或句號
+    """
+    return APA_TITLE_RE.search(ref_text)
+
+def find_apa_matches(ref_text):
+    """
+    回傳符合 APA 格式的年份 match（含位置、原文等）
+    """
+    return list(scan_reference(ref_text).apa_matches)
+
+
+# ========== APA_LIKE規則 ==========
+def find_apalike(ref_text):
+    return [(m.group(1), m.start(1)) for m in scan_reference(ref_text).apalike_matches]
+
+def match_apalike_title_section(ref_text):
+# 類型 1：常見格式（, 2020. Title.）
+    match = APALIKE_TITLE_RE.search(ref_text)
+    if match:
+        return match
+
+    # 類型 2：特殊中文格式（，2020，。Title）
+    return APALIKE_ZH_TITLE_RE.search(ref_text)
+
+def find_apalike_matches(ref_text):
+    """
+    回傳符合 APA_LIKE 格式的年份 match（含位置、原文等）
+    """
+    return list(scan_reference(ref_text).apalike_matches)
+
+
+# ========== 單次掃描 ==========
+class ReferenceScan:
+    """
+    單筆參考文獻的掃描結果，以預先編譯的樣式各跑一次，所有規則函式共用
+    - apa：第一個括號年份是否有效（find_apa）
+    - apa_matches / apalike_matches：有效的年份 match
+    - style、doi、title、title_span、is_head
+    """
+    __slots__ = (
+        "text", "apa", "apa_matches", "apalike_matches",
+        "style", "doi", "title", "title_span", "is_head",
+    )
+
+    def __init__(self, ref_text):
+        self.text = ref_text
+
+        # APA：所有括號年份；find_apa 只看第一個
+        self.apa = False
+        apa_matches = []
+        for idx, m in enumerate(APA_YEAR_RE.finditer(ref_text)):
+            year = m.group(1)
+            if has_digit_before(ref_text, m.start(1)):
+                valid = False
+            elif year[:4].isdigit():
+                valid = is_valid_year(year[:4])
+            else:
+                valid = year.lower() == "n.d."
+            if idx == 0:
+                self.apa = valid
+            if valid:
+                apa_matches.append(m)
+        self.apa_matches = tuple(apa_matches)
+
+        # APA_LIKE 類型 1：標點 + 年份 + 標點（常見格式）
+        arxiv_years = None
+        apalike_matches = []
+        for m in APALIKE_YEAR_RE.finditer(ref_text):
+            year_str = m.group(1)
+            year_pos = m.start(1)
+            if not is_valid_year(year_str[:4]) or has_digit_before(ref_text, year_pos):
+                continue
+            if DOI_TAIL_RE.match(ref_text, m.end(1), m.end(1) + 5):
+                continue
+            if arxiv_years is None:
+                arxiv_years = [(a.start(), a.group(1)) for a in ARXIV_YEAR_RE.finditer(ref_text)]
+            arxiv_start = next((start for start, year in arxiv_years if year.startswith(year_str)), None)
+            if arxiv_start is not None and arxiv_start < year_pos:
+                continue
+            apalike_matches.append(m)
+
+        # APA_LIKE 類型 2：特殊中文格式「，2020，。」
+        for m in APALIKE_ZH_YEAR_RE.finditer(ref_text):
+            if is_valid_year(m.group(1)[:4]) and not has_digit_before(ref_text, m.start(1)):
+                apalike_matches.append(m)
+        self.apalike_matches = tuple(apalike_matches)
+
+        ieee_head = IEEE_HEAD_RE.match(ref_text) is not None
+        self.is_head = self.apa or ieee_head or bool(self.apalike_matches)
+
+        if ieee_head or '"' in ref_text:
+            self.style = "IEEE"
+        elif self.apa:
+            self.style = "APA"
+        elif self.apalike_matches:
+            self.style = "APA_LIKE"
+        else:
+            self.style = "Unknown"
+
+        self.doi = extract_doi(ref_text)
+        self.title, self.title_span = extract_title_with_span(ref_text, self.style)
+
+    @property
+    def year_matches(self):
+        return self.apa_matches + self.apalike_matches
+
+
+@lru_cache(maxsize=8192)
+def scan_reference(ref_text):
+    """
+    同一字串只掃描一次；合併、切分、風格判斷與逐筆解析都共用同一份結果
+    """
+    return ReferenceScan(ref_text)
+
+
+# ================================================================================================
+
+
+# ========== 偵測格式 ==========
+def detect_reference_style(ref_text):
+    # IEEE 通常開頭是 [1]，或含有英文引號 "標題"；其次 APA，再其次 APA_LIKE
+    return scan_reference(ref_text).style
+
+def is_reference_head(para):
+    """
+    判斷段落是否為參考文獻開頭（APA、APA_LIKE 或 IEEE）
+    """
+    return scan_reference(para).is_head
+
+# ========== 擷取標題 ==========
+DOT_DIGIT_RE = re.compile(r'\.\d')
+
+def extract_title(ref_text, style):
+    return extract_title_with_span(ref_text, style)[0]
+
+def extract_title_with_span(ref_text, style):
+    """
+    回傳 (標題, 標題在原文中的 span)；span 為清除前後標點前的範圍
+    """
+    if style == "APA":
+        match = match_apa_title_section(ref_text)
+        if match:
+            year_str = match.group(1)[:4]
+            if year_str.isdigit() and not is_valid_year(year_str):
+                return None, None
+            return match.group(2).strip(" ,。"), match.span(2)
+
+    elif style == "IEEE":
+        matches = list(IEEE_QUOTED_RE.finditer(ref_text))
+        if matches:
+            longest = max(matches, key=lambda m: len(m.group(1)))
+            return longest.group(1).strip().rstrip(",."), longest.span(1)
+        fallback = IEEE_FALLBACK_RE.search(ref_text)
+        if fallback:
+            return fallback.group(1).strip(" ,."), fallback.span(1)
+
+    elif style == "APA_LIKE":
+        match = match_apalike_title_section(ref_text)
+        if match:
+            year_str = match.group(1)
+            if is_valid_year(year_str) and not DOT_DIGIT_RE.match(ref_text, match.end(1), match.end(1) + 5):
+                return match.group(2).strip(" ,。"), match.span(2)
+
+    return None, None
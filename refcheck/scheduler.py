@@ -0,0 +1,108 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+
+# ========== 查詢排程設定 ==========
+# 每個查詢來源各自的併發上限（concurrency）與速率上限（rate：每秒請求數）
+PROVIDER_LIMITS = {
+    "crossref": {"concurrency": 8, "rate": 20},
+    "scopus": {"concurrency": 4, "rate": 6},
+    "serpapi": {"concurrency": 3, "rate": 3},
+}
+
+# 同時處理的參考文獻筆數（整體 worker 數）
+DEFAULT_WORKERS = 8
+
+
+# ========== 速率限制（token bucket） ==========
+class RateLimiter:
+    """
+    每秒最多放行 rate 次請求，允許短暫累積至 burst 次
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1, rate))
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class ProviderGate:
+    """
+    單一查詢來源的閘門：同時受併發數與速率限制
+    """
+
+    def __init__(self, concurrency, rate):
+        self._semaphore = threading.BoundedSemaphore(concurrency)
+        self._limiter = RateLimiter(rate)
+
+    @contextmanager
+    def slot(self):
+        with self._semaphore:
+            self._limiter.acquire()
+            yield
+
+
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+def get_gate(provider):
+    with _gates_lock:
+        gate = _gates.get(provider)
+        if gate is None:
+            limits = PROVIDER_LIMITS.get(provider, {"concurrency": 1, "rate": 1})
+            gate = ProviderGate(limits["concurrency"], limits["rate"])
+            _gates[provider] = gate
+        return gate
+
+
+def provider_slot(provider):
+    """
+    用法：with provider_slot("scopus"): requests.get(...)
+    """
+    return get_gate(provider).slot()
+
+
+# ========== 平行查詢 ==========
+def run_lookups(items, lookup_fn, on_progress=None, max_workers=DEFAULT_WORKERS, on_result=None):
+    """
+    以有限的 worker pool 平行執行 lookup_fn(*item)
+    - 回傳結果順序與 items 相同（不受完成先後影響）
+    - on_progress(done, total) 在呼叫端執行緒觸發，可直接更新 Streamlit 元件
+    - on_result(index, result) 依完成先後、在呼叫端執行緒觸發（index 為 items 中的位置）
+    """
+    items = list(items)
+    results = [None] * len(items)
+    if not items:
+        return results
+
+    workers = max(1, min(max_workers, len(items)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(lookup_fn, *item): idx for idx, item in enumerate(items)}
+        done = 0
+        for future in as_completed(futures):
+            idx = futures[future]
+            results[idx] = future.result()
+            done += 1
+            if on_result:
+                on_result(idx, results[idx])
+            if on_progress:
+                on_progress(done, len(items))
+
+    return results
@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+
+from . import http_client
+
+
+# ========== SerpAPI 額度設定 ==========
+# 剩餘額度低於此值時不再做補救查詢（每筆參考文獻最多省下 1 次）
+SERPAPI_LOW_CREDITS = int(os.environ.get("REFCHECK_SERPAPI_LOW_CREDITS", 100))
+
+# 讀不到帳戶剩餘額度（account.json）時，以此額度在本地扣減追蹤；0 為不限制
+SERPAPI_CREDIT_ALLOWANCE = int(os.environ.get("REFCHECK_SERPAPI_CREDITS", 1000))
+
+# 每筆參考文獻最多使用的額度：標題查詢 + 補救查詢
+CREDITS_PER_REFERENCE = 2
+
+# 帳戶剩餘額度的重新讀取間隔（秒）；期間以本地扣減追蹤
+ACCOUNT_REFRESH_SECONDS = 5 * 60
+
+# SerpAPI 額度用完時的錯誤訊息片段
+QUOTA_ERROR_HINTS = ("run out of searches", "searches for the month are exhausted")
+
+
+class CreditsExhausted(Exception):
+    """
+    額度不足，查詢未送出；不寫入查詢快取，額度恢復後重新查詢即可
+    """
+
+
+def is_quota_error(message):
+    message = (message or "").lower()
+    return any(hint in message for hint in QUOTA_ERROR_HINTS)
+
+
+# ========== 額度管理 ==========
+class CreditBudget:
+    """
+    整個 server 行程共用的 SerpAPI 額度
+    - 剩餘額度讀自 account.json（不消耗額度），之後每次查詢在本地扣減
+    - 從未讀到時改以 SERPAPI_CREDIT_ALLOWANCE 減去本行程已用的次數計算，同樣在本地扣減
+    - 每個查詢工作先預留額度（reserve），多個 session 同時查詢時不會互相用光；預留用完可再借用未預留的額度
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.remaining = None
+        self.exhausted = False
+        self.refreshed_at = 0.0
+        self.spent = 0  # 本行程送出的查詢數
+        self._reservations = set()
+
+    def refresh(self, api_key, force=False):
+        if not api_key or (not force and time.monotonic() - self.refreshed_at < ACCOUNT_REFRESH_SECONDS):
+            return self.remaining
+        try:
+            response = http_client.get(
+                "serpapi", http_client.endpoint("serpapi", "/account.json"), params={"api_key": api_key}
+            )
+            left = response.json().get("total_searches_left") if response.status_code == 200 else None
+        except Exception:
+            left = None
+        with self._lock:
+            self.refreshed_at = time.monotonic()
+            if left is not None:
+                self.remaining = int(left)
+            elif self.remaining is None and SERPAPI_CREDIT_ALLOWANCE > 0:
+                self.remaining = max(0, SERPAPI_CREDIT_ALLOWANCE - self.spent)
+            if self.remaining is not None:
+                self.exhausted = self.remaining <= 0
+        return self.remaining
+
+    @property
+    def reserved(self):
+        return sum(r.unspent for r in self._reservations)
+
+    def reserve(self, credits):
+        with self._lock:
+            granted = credits
+            if self.remaining is not None:
+                granted = max(0, min(credits, self.remaining - self.reserved))
+            reservation = Reservation(self, granted, short=granted < credits)
+            self._reservations.add(reservation)
+            return reservation
+
+    def release(self, reservation):
+        with self._lock:
+            self._reservations.discard(reservation)
+
+    def mark_exhausted(self):
+        with self._lock:
+            self.exhausted = True
+            self.remaining = 0
+
+    def low(self):
+        return self.exhausted or (self.remaining is not None and self.remaining <= SERPAPI_LOW_CREDITS)
+
+    def _spend(self, reservation):
+        # 呼叫端需持有 self._lock
+        if self.exhausted:
+            return False
+        if self.remaining is None:
+            reservation.spent += 1
+            self.spent += 1
+            return True
+        if reservation.unspent <= 0:
+            if self.remaining - self.reserved <= 0:
+                return False
+            reservation.granted += 1  # 借用未預留的額度
+        reservation.spent += 1
+        self.spent += 1
+        self.remaining -= 1
+        return True
+
+
+class Reservation:
+    """
+    單一查詢工作的預留額度；用 with 區塊結束時歸還未使用的部分
+    short：預留不足（每筆 CREDITS_PER_REFERENCE 次），此時額度優先留給標題查詢
+    """
+
+    def __init__(self, budget, granted, short=False):
+        self.budget = budget
+        self.granted = granted
+        self.short = short
+        self.spent = 0
+        self.skipped_remedial = 0
+
+    @property
+    def unspent(self):
+        return max(0, self.granted - self.spent)
+
+    def spend(self, remedial=False):
+        """
+        扣減 1 次額度，額度不足時回傳 False
+        補救查詢（remedial=True）在剩餘額度偏低或預留不足時也略過，把額度留給其他參考文獻的標題查詢
+        """
+        with self.budget._lock:
+            if remedial and (self.short or self.budget.low()):
+                self.skipped_remedial += 1
+                return False
+            if not self.budget._spend(self):
+                if remedial:
+                    self.skipped_remedial += 1
+                return False
+            return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.budget.release(self)
+        return False
+
+
+_budget = CreditBudget()
+
+
+def get_budget():
+    return _budget
+
+
+def reserve_credits(references, api_key):
+    """
+    依參考文獻筆數預留額度（每筆最多 CREDITS_PER_REFERENCE 次）；會先更新帳戶剩餘額度
+    """
+    if references:
+        _budget.refresh(api_key)
+    return _budget.reserve(CREDITS_PER_REFERENCE * references)
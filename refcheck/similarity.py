@@ -0,0 +1,110 @@
+import os
+from collections import Counter
+from difflib import SequenceMatcher
+
+
+# ========== 標題相似度 ==========
+# 逐字元比較（clean_title 後的字串），中文每個字就是一個比較單位，不需斷詞
+#
+# 評分方式：
+# - "ratcliff"：與 difflib.SequenceMatcher.ratio() 完全相同（預設，分類結果與原本一致）
+# - "indel"：2 * LCS / (len(a) + len(b))，以位元平行 LCS 計算，不需 SequenceMatcher
+# 兩者都先用上界篩掉不可能達到門檻的候選，不必算完整分數
+SIMILARITY_SCORER = os.environ.get("REFCHECK_SIMILARITY", "ratcliff")
+
+
+class QueryProfile:
+    """
+    一個查詢字串的前處理（字元計數、LCS 位元遮罩），對多個候選評分時共用
+    """
+    __slots__ = ("text", "length", "counts", "masks", "full_mask")
+
+    def __init__(self, text):
+        self.text = text
+        self.length = len(text)
+        self.counts = Counter(text)
+        masks = {}
+        for i, ch in enumerate(text):
+            masks[ch] = masks.get(ch, 0) | (1 << i)
+        self.masks = masks
+        self.full_mask = (1 << len(text)) - 1
+
+
+def lcs_length(profile, other):
+    """
+    位元平行 LCS（Hyyrö）：每個字元只做幾次大整數運算，時間約為 O(len(other))
+    """
+    v = profile.full_mask
+    masks = profile.masks
+    for ch in other:
+        u = v & masks.get(ch, 0)
+        v = ((v + u) | (v - u)) & profile.full_mask
+    return profile.length - bin(v).count("1")
+
+
+def _upper_bounds_reach(profile, other, threshold):
+    """
+    依序檢查 ratio 的上界，任一上界低於門檻即可確定不會達標
+    - 長度：2 * min / 總長（同 SequenceMatcher.real_quick_ratio）
+    - 字元多重集合交集（同 quick_ratio）
+    - LCS：SequenceMatcher 找到的相符字元不會多於 LCS
+    """
+    # 與 ratio 相同的算式（2.0 * m / total），浮點誤差下也不會誤刪達標的候選
+    total = profile.length + len(other)
+    if not total:
+        return True
+    if 2.0 * min(profile.length, len(other)) / total < threshold:
+        return False
+
+    counts = profile.counts
+    avail = {}
+    matches = 0
+    for ch in other:
+        n = avail.get(ch, counts.get(ch, 0))
+        if n > 0:
+            matches += 1
+        avail[ch] = n - 1
+    if 2.0 * matches / total < threshold:
+        return False
+
+    return 2.0 * lcs_length(profile, other) / total >= threshold
+
+
+def ratcliff_score(profile, other, threshold=0.0):
+    """
+    與 SequenceMatcher(None, query, other).ratio() 相同；可確定低於門檻時直接回傳 0.0
+    """
+    if other == profile.text:
+        return 1.0
+    if threshold > 0 and not _upper_bounds_reach(profile, other, threshold):
+        return 0.0
+    return SequenceMatcher(None, profile.text, other).ratio()
+
+
+def indel_score(profile, other, threshold=0.0):
+    if other == profile.text:
+        return 1.0
+    total = profile.length + len(other)
+    if 2.0 * min(profile.length, len(other)) / total < threshold:
+        return 0.0
+    return 2.0 * lcs_length(profile, other) / total
+
+
+SCORERS = {
+    "ratcliff": ratcliff_score,
+    "indel": indel_score,
+}
+
+
+def score_many(query, candidates, threshold=0.0, scorer=None):
+    """
+    一個查詢對多個候選評分，回傳與 candidates 同順序的分數
+    低於 threshold 的候選分數不保證精確（可能直接給 0.0），只保證仍低於門檻
+    """
+    score = SCORERS[scorer or SIMILARITY_SCORER]
+    profile = QueryProfile(query)
+    return [score(profile, candidate, threshold) for candidate in candidates]
+
+
+def similarity(a, b, threshold=0.0, scorer=None):
+    return score_many(a, [b], threshold, scorer)[0]
@@ -0,0 +1,270 @@
+import csv
+import json
+import os
+import sqlite3
+import threading
+import zlib
+
+from .lookup_cache import CACHE_DIR
+from .normalize import clean_title
+from .results import Status
+from .similarity import score_many
+
+
+# ========== 本地標題索引設定 ==========
+# 快照檔（JSONL 或 CSV，欄位 title / url / source），例如 Crossref 子集、本校典藏匯出、先前查核命中的標題
+TITLE_INDEX_SNAPSHOT = os.environ.get("REFCHECK_TITLE_INDEX", "")
+
+# 由快照建好的索引檔；快照未變動時直接開啟，不重建
+TITLE_INDEX_PATH = os.path.join(CACHE_DIR, "title_index.sqlite3")
+
+# 索引檔以 mmap 讀取的上限（bytes）
+TITLE_INDEX_MMAP_BYTES = 1024 * 1024 * 1024
+
+# 只有 clean_title 後完全相同才算本地命中；LSH 候選相似度達此門檻只記為類似標題，仍照常查 Scopus / Google Scholar
+LOCAL_SIMILAR_THRESHOLD = 0.95
+
+# MinHash（one permutation hashing）：32 個 bin，每 2 個 bin 組成一個 LSH band
+MINHASH_BINS = 32
+LSH_ROWS = 2
+SHINGLE_SIZE = 3
+_BIN_SHIFT = 32 - (MINHASH_BINS.bit_length() - 1)
+_VALUE_BITS = _BIN_SHIFT
+_EMPTY = (1 << _VALUE_BITS) - 1
+
+# 每次查詢最多驗證的候選數
+MAX_CANDIDATES = 20
+
+# 建索引時每幾筆寫入一次
+_BUILD_BATCH = 5000
+
+
+# ========== MinHash / LSH ==========
+def shingles(key):
+    # 字元 n-gram；中文不需斷詞，英文含空白也能表達詞界
+    if len(key) <= SHINGLE_SIZE:
+        return {key}
+    return {key[i:i + SHINGLE_SIZE] for i in range(len(key) - SHINGLE_SIZE + 1)}
+
+
+def minhash(key):
+    """
+    每個 shingle 只算一次 crc32：高位元決定 bin，低位元取最小值
+    """
+    mins = [_EMPTY] * MINHASH_BINS
+    mask = _EMPTY
+    for shingle in shingles(key):
+        h = zlib.crc32(shingle.encode("utf-8"))
+        b = h >> _BIN_SHIFT
+        v = h & mask
+        if v < mins[b]:
+            mins[b] = v
+    return mins
+
+
+def lsh_keys(key):
+    """
+    回傳各 band 的整數 key（band 編號放在最高位元）；整個 band 都是空 bin 時略過
+    """
+    mins = minhash(key)
+    keys = []
+    for band, i in enumerate(range(0, MINHASH_BINS, LSH_ROWS)):
+        rows = mins[i:i + LSH_ROWS]
+        if all(v == _EMPTY for v in rows):
+            continue
+        value = band
+        for v in rows:
+            value = (value << _VALUE_BITS) | v
+        keys.append(value)
+    return keys
+
+
+# ========== 讀取快照 ==========
+def read_snapshot(path):
+    """
+    產出 (title, url, source)；JSONL 每行一筆，CSV 需有 title 欄
+    """
+    default_source = os.path.basename(path)
+    if path.lower().endswith((".jsonl", ".json")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                yield record.get("title") or "", record.get("url") or "", record.get("source") or default_source
+    else:
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            for record in csv.DictReader(f):
+                yield record.get("title") or "", record.get("url") or "", record.get("source") or default_source
+
+
+def snapshot_signature(path):
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+# ========== 索引 ==========
+class TitleIndex:
+    """
+    以 SQLite 儲存的標題索引，開檔後以 mmap 讀取，不需重建
+    - titles：clean_title 後的 key 與原始標題、連結、來源
+    - lsh：各 band 的 MinHash key → 標題 id
+    查詢時先比對完全相同的 key，再由 LSH 找候選並以相似度驗證（類似標題）
+    """
+
+    def __init__(self, path=TITLE_INDEX_PATH, threshold=LOCAL_SIMILAR_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._conn.execute(f"PRAGMA mmap_size={TITLE_INDEX_MMAP_BYTES}")
+        self.size = self._conn.execute("SELECT COUNT(*) FROM titles").fetchone()[0]
+
+    def lookup(self, title):
+        """
+        回傳 (原始標題, 連結, 來源, 相似度, 是否完全相同)；沒有足夠相似的標題時回傳 None
+        """
+        key = clean_title(title)
+        if not key:
+            return None
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT title, url, source FROM titles WHERE key = ? LIMIT 1", (key,)
+            ).fetchone()
+            if row:
+                return row[0], row[1], row[2], 1.0, True
+
+            band_keys = lsh_keys(key)
+            placeholders = ",".join("?" * len(band_keys))
+            candidates = self._conn.execute(
+                f"SELECT t.key, t.title, t.url, t.source FROM titles t JOIN ("
+                f"  SELECT id, COUNT(*) AS hits FROM lsh WHERE k IN ({placeholders})"
+                f"  GROUP BY id ORDER BY hits DESC LIMIT ?"
+                f") c ON t.id = c.id",
+                (*band_keys, MAX_CANDIDATES),
+            ).fetchall()
+
+        best = None
+        scores = score_many(key, [c[0] for c in candidates], self.threshold)
+        for (_, candidate_title, url, source), score in zip(candidates, scores):
+            if score >= self.threshold and (best is None or score > best[3]):
+                best = (candidate_title, url, source, score, False)
+        return best
+
+    def close(self):
+        self._conn.close()
+
+
+def build_title_index(snapshot, path=TITLE_INDEX_PATH):
+    """
+    由快照建立索引檔；先寫到暫存檔再替換，其他行程不會讀到建到一半的索引
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("CREATE TABLE titles (id INTEGER PRIMARY KEY, key TEXT NOT NULL, title TEXT, url TEXT, source TEXT)")
+    conn.execute("CREATE TABLE lsh (k INTEGER NOT NULL, id INTEGER NOT NULL, PRIMARY KEY (k, id)) WITHOUT ROWID")
+
+    seen = set()
+    titles, bands = [], []
+
+    def flush():
+        conn.executemany("INSERT INTO titles (id, key, title, url, source) VALUES (?, ?, ?, ?, ?)", titles)
+        conn.executemany("INSERT OR IGNORE INTO lsh (k, id) VALUES (?, ?)", bands)
+        titles.clear()
+        bands.clear()
+
+    for title, url, source in read_snapshot(snapshot):
+        key = clean_title(title)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        title_id = len(seen)
+        titles.append((title_id, key, title, url, source))
+        bands.extend((k, title_id) for k in lsh_keys(key))
+        if len(titles) >= _BUILD_BATCH:
+            flush()
+    flush()
+
+    conn.execute("CREATE INDEX idx_titles_key ON titles(key)")
+    conn.execute("INSERT INTO meta (name, value) VALUES ('snapshot', ?)", (snapshot_signature(snapshot),))
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, path)
+
+
+def index_signature(path):
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE name = 'snapshot'").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+
+def open_title_index(snapshot, path=TITLE_INDEX_PATH):
+    """
+    快照未變動（路徑、大小、修改時間相同）時直接開啟既有索引，否則重建
+    """
+    if index_signature(path) != snapshot_signature(snapshot):
+        build_title_index(snapshot, path)
+    return TitleIndex(path)
+
+
+# ========== 共用索引（每個行程一份） ==========
+_index = None
+_index_snapshot = None
+_index_lock = threading.Lock()
+
+
+def set_title_index_snapshot(snapshot):
+    global TITLE_INDEX_SNAPSHOT
+    TITLE_INDEX_SNAPSHOT = snapshot or ""
+
+
+def get_title_index():
+    """
+    沒有設定快照時回傳 None，查詢流程直接略過
+    """
+    global _index, _index_snapshot
+    if not TITLE_INDEX_SNAPSHOT:
+        return None
+    with _index_lock:
+        if _index is None or _index_snapshot != TITLE_INDEX_SNAPSHOT:
+            if _index is not None:
+                _index.close()
+            _index = open_title_index(TITLE_INDEX_SNAPSHOT)
+            _index_snapshot = TITLE_INDEX_SNAPSHOT
+        return _index
+
+
+# ========== 匯出已查核標題 ==========
+# 這些分類代表標題本身已被查詢來源確認（Crossref 只確認 DOI，不列入）
+VERIFIED_STATUSES = (Status.SCOPUS, Status.SCHOLAR)
+
+
+def export_verified_titles(results, path):
+    """
+    將本次標題命中的參考文獻附加到 JSONL 快照，之後的查核可直接在本地命中
+    回傳寫入筆數
+    """
+    count = 0
+    with open(path, "a", encoding="utf-8") as f:
+        for result in results:
+            for r in result.with_status(*VERIFIED_STATUSES):
+                if r.title:
+                    record = {"title": r.title, "url": r.url, "source": r.status.value}
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    count += 1
+    return count